@@ -470,6 +470,18 @@ class AdaNode(ASTNode):
         """
         pass
 
+    @langkit_property(public=True, return_type=AnalysisUnit.array,
+                      external=True, uses_entity_info=False, uses_envs=False)
+    def import_closure():
+        """
+        Return the list of units that the unit in which this node lies
+        imports, directly or transitively, in breadth-first order. Imports
+        are the units designated by with clauses plus the implicit ones: the
+        specification of a body and the parent of a child unit. This is the
+        import graph that ``filter_is_imported_by`` walks.
+        """
+        pass
+
     @langkit_property(return_type=AnalysisUnit.array)
     def unique_units(list_of_units=AnalysisUnit.array):
         """
@@ -575,6 +587,101 @@ class AdaNode(ASTNode):
         Entity.parents.find(lambda p: p.xref_entry_point).resolve_names
     )
 
+    @langkit_property(return_type=T.AdaNode.entity.array)
+    def xref_entry_points():
+        """
+        Return all the xref entry points in the subtree rooted at this node,
+        including itself, in prefix order.
+        """
+        return If(
+            Self.xref_entry_point, Entity.singleton, No(T.AdaNode.entity.array)
+        ).concat(Entity.children.filter(lambda c: Not(c.is_null)).mapcat(
+            lambda c: c.xref_entry_points
+        ))
+
+    @langkit_property(return_type=T.XrefEntry.array,
+                      dynamic_vars=[imprecise_fallback])
+    def xref_entries(entry_point=T.AdaNode.entity, success=Bool):
+        """
+        Helper for ``resolve_xrefs``. Return xref entries for all the
+        expressions in this subtree that belong to ``entry_point``, after
+        name resolution was run on it.
+        """
+        own_entry = Var(Entity.cast(T.Expr).then(
+            lambda e: If(
+                e.cast(T.Name).then(lambda n: n.is_defining),
+                No(T.XrefEntry.array),
+                T.XrefEntry.new(
+                    node=e,
+                    ref=e.cast(T.Name).then(lambda n: n.xref),
+                    expr_type=e.expression_type,
+                    entry_point=entry_point,
+                    success=success
+                ).singleton
+            )
+        ))
+
+        # Like resolve_names, do not explore other xref entry points, nor
+        # defining names.
+        stop = Var(Or(
+            Self.xref_entry_point & (Self != entry_point.node),
+            Self.is_a(T.DefiningName) & Not(Self.xref_entry_point)
+        ))
+
+        return own_entry.concat(If(
+            stop,
+            No(T.XrefEntry.array),
+            Entity.children.filter(lambda c: Not(c.is_null)).mapcat(
+                lambda c: c.xref_entries(entry_point, success)
+            )
+        ))
+
+    @langkit_property(return_type=T.XrefEntry.array, public=True,
+                      dynamic_vars=[default_imprecise_fallback()])
+    def resolve_xrefs():
+        """
+        Run name resolution on this node, which must be an xref entry point,
+        and return the resulting xref entries for the expressions it
+        contains, leaving out the xref entry points nested in it. If name
+        resolution fails and ``imprecise_fallback`` is False, a single entry
+        with ``success`` set to False is returned for this node. Property
+        errors raised by name resolution, ``xref`` or ``expression_type`` are
+        propagated.
+
+        This is equivalent to calling ``resolve_names`` on this node, then
+        ``xref`` and ``expression_type`` on each expression, but avoids a
+        round-trip through the bindings for each of these calls.
+        """
+        return If(
+            Not(Self.xref_entry_point),
+            PropertyError(T.XrefEntry.array,
+                          "resolve_xrefs called on a non entry point"),
+            Let(lambda success=Entity.resolve_names: If(
+                success | imprecise_fallback,
+                Entity.xref_entries(Entity, success),
+                T.XrefEntry.new(
+                    node=Entity,
+                    ref=No(T.DefiningName.entity),
+                    expr_type=No(T.BaseTypeDecl.entity),
+                    entry_point=Entity,
+                    success=False
+                ).singleton
+            ))
+        )
+
+    @langkit_property(return_type=T.XrefEntry.array, public=True,
+                      dynamic_vars=[default_imprecise_fallback()])
+    def resolve_all_xrefs():
+        """
+        Call ``resolve_xrefs`` on all the xref entry points in the subtree
+        rooted at this node, in prefix order, and return the concatenation of
+        the results. Property errors are propagated.
+
+        This is meant to resolve whole units at once, with a single round-trip
+        through the bindings.
+        """
+        return Entity.xref_entry_points.mapcat(lambda ep: ep.resolve_xrefs)
+
     # TODO: Navigation properties are not ready to deal with units containing
     # multiple packages.
 
@@ -2738,6 +2845,21 @@ class LogicValResult(Struct):
     value = UserField(type=T.AdaNode.entity)
 
 
+class XrefEntry(Struct):
+    """
+    Result of name resolution for one expression, as returned by
+    ``AdaNode.resolve_xrefs``. ``entry_point`` is the xref entry point
+    that contains ``node``, and ``success`` is True iff name resolution
+    succeeded for it. ``ref`` is the declaration that ``node`` references (if
+    it is a name) and ``expr_type`` is its type.
+    """
+    node = UserField(type=T.AdaNode.entity)
+    ref = UserField(type=T.DefiningName.entity)
+    expr_type = UserField(type=T.BaseTypeDecl.entity)
+    entry_point = UserField(type=T.AdaNode.entity)
+    success = UserField(type=Bool)
+
+
 @abstract
 class BaseTypeDecl(BasicDecl):
     """
@@ -4,6 +4,7 @@ with Ada.Containers.Generic_Array_Sort;
 with Ada.Containers.Synchronized_Queue_Interfaces;
 with Ada.Containers.Unbounded_Synchronized_Queues;
 with Ada.Containers.Vectors;
+with Ada.Directories;
 with Ada.Exceptions;
 with Ada.Strings.Unbounded; use Ada.Strings.Unbounded;
 with Ada.Text_IO;
@@ -13,9 +14,11 @@ with GNAT.Traceback.Symbolic;
 with GNATCOLL.JSON;
 with GNATCOLL.Opt_Parse;
 with GNATCOLL.Projects;  use GNATCOLL.Projects;
+with GNATCOLL.Strings;   use GNATCOLL.Strings;
 with GNATCOLL.Traces;
 with GNATCOLL.VFS;       use GNATCOLL.VFS;
 
+with Langkit_Support.Adalog;
 with Langkit_Support.Adalog.Debug;   use Langkit_Support.Adalog.Debug;
 with Langkit_Support.Slocs;          use Langkit_Support.Slocs;
 with Langkit_Support.Text;           use Langkit_Support.Text;
@@ -33,13 +36,18 @@ procedure Nameres is
    package String_Vectors is new Ada.Containers.Vectors
      (Positive, Unbounded_String);
 
-   package String_QI
-   is new Ada.Containers.Synchronized_Queue_Interfaces (Unbounded_String);
+   package String_Vectors_QI
+   is new Ada.Containers.Synchronized_Queue_Interfaces
+     (String_Vectors.Vector);
 
-   package String_Queues
-   is new Ada.Containers.Unbounded_Synchronized_Queues (String_QI);
+   package String_Vectors_Queues
+   is new Ada.Containers.Unbounded_Synchronized_Queues (String_Vectors_QI);
 
-   Queue : String_Queues.Queue;
+   Queue : String_Vectors_Queues.Queue;
+   --  Chunks of consecutive files to process. Files that are next to each
+   --  other (for instance a spec, its body and its child units) tend to
+   --  depend on the same units: handing them to the same job lets them share
+   --  the units loaded in its context instead of loading them once per job.
 
    pragma Warnings (Off, "ref");
 
@@ -52,6 +60,29 @@ procedure Nameres is
       File_With_Most_Fails : Unbounded_String;
    end Stats_Data;
 
+   type Node_Timing is record
+      Filename : Unbounded_String;
+      Sloc     : Unbounded_String;
+      Time     : Duration;
+   end record;
+
+   package Node_Timing_Vectors is new Ada.Containers.Vectors
+     (Positive, Node_Timing);
+
+   protected Slowest_Nodes is
+      procedure Add (Timing : Node_Timing);
+      --  Record the time it took to resolve a node, keeping only the
+      --  Args.Nb_Slowest_Nodes slowest ones.
+
+      function Get return Node_Timing_Vectors.Vector;
+      --  Return the slowest nodes, sorted by decreasing resolution time
+
+      procedure Clear;
+      --  Forget all recorded nodes
+   private
+      Nodes : Node_Timing_Vectors.Vector;
+   end Slowest_Nodes;
+
    package Args is
       use GNATCOLL.Opt_Parse;
       Parser : Argument_Parser := Create_Argument_Parser
@@ -119,6 +150,18 @@ procedure Nameres is
         (Parser, "-t", "--timeout", "Timeout equation solving after N steps",
          Natural, Default_Val => 100_000);
 
+      package Nb_Slowest_Nodes is new Parse_Option
+        (Parser, Long => "--slowest-nodes",
+         Help         => "Number of slowest nodes to report with --stats or"
+                         & " --json",
+         Arg_Type     => Natural,
+         Default_Val  => 10);
+
+      package Batch is new Parse_Flag
+        (Parser, Long => "--batch",
+         Help         => "Read the description of tests to run from the"
+                         & " standard input (see Run_Batch)");
+
       package Jobs is new Parse_Option
         (Parser, "-j", "--jobs", "Number of parallel jobs to use",
          Natural, Default_Val => 1);
@@ -180,6 +223,15 @@ procedure Nameres is
    UFP : Unit_Provider_Reference;
    --  When project file handling is enabled, corresponding unit provider
 
+   Project : Project_Tree_Access;
+   Env     : Project_Environment_Access;
+   --  When project file handling is enabled, loaded project and the
+   --  environment (scenario variables, ...) used to load it. UFP does not own
+   --  them, so that Free_Project can release them as soon as a run is done.
+
+   procedure Free_Project;
+   --  Reset UFP and unload/free Project and Env
+
    function Text (N : Ada_Node'Class) return String is (Image (Text (N)));
 
    function "+" (S : String) return Unbounded_String
@@ -206,6 +258,21 @@ procedure Nameres is
 
    procedure Show_Stats;
 
+   procedure Put_File_JSON
+     (Filename          : String;
+      Time_Elapsed      : Duration;
+      Exception_Message : String := "");
+   --  In JSON mode, output the record that signals the end of the analysis
+   --  of Filename, which took Time_Elapsed. All the "node_resolution"
+   --  records for this file come before it.
+
+   function Is_Timeout (E : Ada.Exceptions.Exception_Occurrence)
+                        return Boolean;
+   --  Return whether E is the Timeout_Error that the logic equation solver
+   --  raises when it reaches the step limit set with --timeout.
+
+   procedure Show_Slowest_Nodes;
+
    function Do_Pragma_Test (Arg : Expr) return Ada_Node_Array is
      (P_Matching_Nodes (Arg));
    --  Do the resolution associated to a Test pragma.
@@ -248,6 +315,73 @@ procedure Nameres is
       end if;
    end Put;
 
+   -------------------
+   -- Slowest_Nodes --
+   -------------------
+
+   protected body Slowest_Nodes is
+
+      ---------
+      -- Add --
+      ---------
+
+      procedure Add (Timing : Node_Timing) is
+         Max      : constant Natural := Args.Nb_Slowest_Nodes.Get;
+         Position : Positive := Nodes.Last_Index + 1;
+      begin
+         if Max = 0
+            or else (Natural (Nodes.Length) = Max
+                     and then Nodes.Last_Element.Time >= Timing.Time)
+         then
+            return;
+         end if;
+
+         for I in Nodes.First_Index .. Nodes.Last_Index loop
+            if Nodes (I).Time < Timing.Time then
+               Position := I;
+               exit;
+            end if;
+         end loop;
+         Nodes.Insert (Position, Timing);
+
+         if Natural (Nodes.Length) > Max then
+            Nodes.Delete_Last;
+         end if;
+      end Add;
+
+      ---------
+      -- Get --
+      ---------
+
+      function Get return Node_Timing_Vectors.Vector is
+      begin
+         return Nodes;
+      end Get;
+
+      -----------
+      -- Clear --
+      -----------
+
+      procedure Clear is
+      begin
+         Nodes.Clear;
+      end Clear;
+
+   end Slowest_Nodes;
+
+   ----------------
+   -- Is_Timeout --
+   ----------------
+
+   function Is_Timeout (E : Ada.Exceptions.Exception_Occurrence)
+                        return Boolean
+   is
+      use type Ada.Exceptions.Exception_Id;
+   begin
+      return Ada.Exceptions.Exception_Identity (E)
+             = Langkit_Support.Adalog.Timeout_Error'Identity;
+   end Is_Timeout;
+
    ------------------
    -- Process_File --
    ------------------
@@ -341,14 +475,38 @@ procedure Nameres is
                else Into);
          end Print_Node;
 
+         procedure Record_Time;
+         --  Record the time it took to resolve Node, for the slowest nodes
+         --  summary and the JSON record.
+
          Dummy : Visit_Status;
 
          Obj : J.JSON_Value;
 
+         Before : constant Time := Clock;
+
+         -----------------
+         -- Record_Time --
+         -----------------
+
+         procedure Record_Time is
+            Time_Elapsed : constant Duration := Clock - Before;
+         begin
+            Slowest_Nodes.Add
+              ((Filename => +Filename,
+                Sloc     => +Image (Node.Sloc_Range),
+                Time     => Time_Elapsed));
+
+            if Args.JSON.Get then
+               Obj.Set_Field ("time", Float (Time_Elapsed));
+            end if;
+         end Record_Time;
+
       begin
          if Args.JSON.Get then
             Obj := J.Create_Object;
             Obj.Set_Field ("kind", "node_resolution");
+            Obj.Set_Field ("timeout", False);
          end if;
 
          if not (Quiet or else Args.Only_Show_Failures.Get) then
@@ -386,6 +544,7 @@ procedure Nameres is
             Put_Line ("");
          end if;
 
+         Record_Time;
          if Args.JSON.Get then
             Ada.Text_IO.Put_Line (Obj.Write);
          end if;
@@ -411,8 +570,10 @@ procedure Nameres is
                New_Line;
             end if;
 
+            Record_Time;
             if Args.JSON.Get then
                Obj.Set_Field ("success", False);
+               Obj.Set_Field ("timeout", Is_Timeout (E));
                Obj.Set_Field
                  ("exception_message", Ada.Exceptions.Exception_Message (E));
 
@@ -658,6 +819,26 @@ procedure Nameres is
       Unchecked_Free (List);
    end Add_Files_From_Project;
 
+   -------------------
+   -- Put_File_JSON --
+   -------------------
+
+   procedure Put_File_JSON
+     (Filename          : String;
+      Time_Elapsed      : Duration;
+      Exception_Message : String := "")
+   is
+      Obj : constant GNATCOLL.JSON.JSON_Value := GNATCOLL.JSON.Create_Object;
+   begin
+      Obj.Set_Field ("kind", "file_analysis");
+      Obj.Set_Field ("file", Filename);
+      Obj.Set_Field ("time", Float (Time_Elapsed));
+      if Exception_Message'Length > 0 then
+         Obj.Set_Field ("exception_message", Exception_Message);
+      end if;
+      Ada.Text_IO.Put_Line (Obj.Write);
+   end Put_File_JSON;
+
    ----------------
    -- Show_Stats --
    ----------------
@@ -686,8 +867,125 @@ procedure Nameres is
       end if;
    end Show_Stats;
 
+   ------------------------
+   -- Show_Slowest_Nodes --
+   ------------------------
+
+   procedure Show_Slowest_Nodes is
+      package J renames GNATCOLL.JSON;
+
+      Nodes : constant Node_Timing_Vectors.Vector := Slowest_Nodes.Get;
+   begin
+      if Args.Nb_Slowest_Nodes.Get = 0 or else Nodes.Is_Empty then
+         return;
+
+      elsif Args.JSON.Get then
+         declare
+            Obj   : constant J.JSON_Value := J.Create_Object;
+            Items : J.JSON_Array;
+         begin
+            for N of Nodes loop
+               declare
+                  Item : constant J.JSON_Value := J.Create_Object;
+               begin
+                  Item.Set_Field ("file", N.Filename);
+                  Item.Set_Field ("sloc", N.Sloc);
+                  Item.Set_Field ("time", Float (N.Time));
+                  J.Append (Items, Item);
+               end;
+            end loop;
+            Obj.Set_Field ("kind", "slowest_nodes");
+            Obj.Set_Field ("nodes", Items);
+            Ada.Text_IO.Put_Line (Obj.Write);
+         end;
+
+      elsif Args.Stats.Get then
+         Put_Line ("Slowest nodes:");
+         for N of Nodes loop
+            Put_Line ("  " & (+N.Filename) & ":" & (+N.Sloc) & ": "
+                      & N.Time'Image & "s");
+         end loop;
+      end if;
+   end Show_Slowest_Nodes;
+
    Files : String_Vectors.Vector;
 
+   Exit_Status : Ada.Command_Line.Exit_Status := Ada.Command_Line.Success;
+   --  Exit status for the last call to Run
+
+   procedure Reset_State;
+   --  Reset the global state left by a previous call to Run
+
+   procedure Run;
+   --  Run name resolution according to the parsed command line arguments
+
+   procedure Run_Batch;
+   --  Run name resolution for several tests in a row, amortizing the cost of
+   --  starting nameres. Each line on the standard input is a JSON object
+   --  describing a test: "dir" is the directory in which to run, "args" the
+   --  list of command line arguments and "output" the file in which to write
+   --  the output (both standard output and standard error, as far as the
+   --  current output and error files are concerned). Once a test is done,
+   --  write Batch_Stderr_End on its own line on the standard error (so that
+   --  the driver can attribute what was written directly to it to the test),
+   --  then a JSON object with its "status" on the standard output.
+   --
+   --  Each test still gets its own analysis context: sharing one between
+   --  tests would make the library units of a test visible to the others.
+
+   Batch_Stderr_End : constant String := "[nameres batch: end of test]";
+   --  Marker for the end of the output of a test on the standard error
+
+   ------------------
+   -- Free_Project --
+   ------------------
+
+   procedure Free_Project is
+   begin
+      UFP := No_Unit_Provider_Reference;
+      if Project /= null then
+         Project.Unload;
+         Free (Project);
+      end if;
+      if Env /= null then
+         Free (Env);
+      end if;
+   end Free_Project;
+
+   -----------------
+   -- Reset_State --
+   -----------------
+
+   procedure Reset_State is
+   begin
+      --  Do not let options of the previous run (--trace, --debug, -X, ...)
+      --  leak into the next one.
+
+      Set_Debug_State (None);
+      Free_Project;
+
+      Stats_Data.Nb_Files_Analyzed := 0;
+      Stats_Data.Nb_Successes := 0;
+      Stats_Data.Nb_Fails := 0;
+      Stats_Data.Nb_Exception_Fails := 0;
+      Stats_Data.Max_Nb_Fails := 0;
+      Stats_Data.File_With_Most_Fails := Null_Unbounded_String;
+      Slowest_Nodes.Clear;
+      Files.Clear;
+      Exit_Status := Ada.Command_Line.Success;
+
+      --  Drop the chunks of files that jobs did not process because of
+      --  --file-limit, so that they are not processed in the next run.
+
+      declare
+         Chunk : String_Vectors.Vector;
+      begin
+         while Queue.Current_Use > 0 loop
+            Queue.Dequeue (Chunk);
+         end loop;
+      end;
+   end Reset_State;
+
    task type Main_Task_Type is
       entry Create_Context (UFP : Unit_Provider_Reference);
       entry Stop;
@@ -698,8 +996,8 @@ procedure Nameres is
    --------------------
 
    task body Main_Task_Type is
-      Ctx : Analysis_Context;
-      F   : Unbounded_String;
+      Ctx   : Analysis_Context;
+      Chunk : String_Vectors.Vector;
    begin
       select
          accept Create_Context (UFP : Unit_Provider_Reference) do
@@ -718,78 +1016,85 @@ procedure Nameres is
          terminate;
       end select;
 
-      loop
+      Main_Loop : loop
          select
-            Queue.Dequeue (F);
-         or
-            delay 0.1;
-            exit;
+            Queue.Dequeue (Chunk);
+         else
+            exit Main_Loop;
          end select;
 
-         declare
-            File     : constant String := +F;
-            Basename : constant String :=
-              +Create (+File).Base_Name;
-            Unit     : Analysis_Unit;
-            Before, After : Time;
-            Time_Elapsed  : Duration;
-         begin
-            Unit := Get_From_File (Ctx, File);
+         for F of Chunk loop
+            declare
+               File     : constant String := +F;
+               Basename : constant String :=
+                 +Create (+File).Base_Name;
+               Unit     : Analysis_Unit;
+               Before        : Time := Clock;
+               After         : Time;
+               Time_Elapsed  : Duration;
+            begin
+               Unit := Get_From_File (Ctx, File);
 
-            if not Quiet then
-               Put_Title ('#', "Analyzing " & Basename);
-            end if;
-            Before := Clock;
-            Process_File (Unit, File);
-            After := Clock;
+               if not Quiet then
+                  Put_Title ('#', "Analyzing " & Basename);
+               end if;
+               Before := Clock;
+               Process_File (Unit, File);
+               After := Clock;
 
-            Time_Elapsed := After - Before;
+               Time_Elapsed := After - Before;
 
-            if Args.Time.Get then
-               Ada.Text_IO.Put_Line
-                 ("Time elapsed in process file for "
-                  & Basename & ": " & Time_Elapsed'Image);
-            end if;
+               if Args.Time.Get then
+                  Ada.Text_IO.Put_Line
+                    ("Time elapsed in process file for "
+                     & Basename & ": " & Time_Elapsed'Image);
+               end if;
 
-            Stats_Data.Nb_Files_Analyzed
-              := Stats_Data.Nb_Files_Analyzed + 1;
-            exit when Args.File_Limit.Get /= -1
-              and then Stats_Data.Nb_Files_Analyzed
-                >= Args.File_Limit.Get;
-         exception
-            when E : others =>
-               Put_Line ("Resolution failed with exception for file " & File);
-               Put_Line ("> " & Ada.Exceptions.Exception_Information (E));
-               Put_Line ("");
-         end;
-      end loop;
+               if Args.JSON.Get then
+                  Put_File_JSON (File, Time_Elapsed);
+               end if;
+
+               Stats_Data.Nb_Files_Analyzed
+                 := Stats_Data.Nb_Files_Analyzed + 1;
+               exit Main_Loop when Args.File_Limit.Get /= -1
+                 and then Stats_Data.Nb_Files_Analyzed
+                   >= Args.File_Limit.Get;
+            exception
+               when E : others =>
+                  Put_Line
+                    ("Resolution failed with exception for file " & File);
+                  Put_Line ("> " & Ada.Exceptions.Exception_Information (E));
+                  Put_Line ("");
+
+                  if Args.JSON.Get then
+                     Put_File_JSON
+                       (File, Clock - Before,
+                        Ada.Exceptions.Exception_Message (E));
+                  end if;
+            end;
+         end loop;
+      end loop Main_Loop;
 
       accept Stop do
          null;
       end Stop;
    end Main_Task_Type;
 
-begin
-
-   --  Setup traces from config file
-   GNATCOLL.Traces.Parse_Config_File;
-
-   --
-   --  Set up of file & project data from command line arguments
-   --
-
-   if not Args.Parser.Parse then
-      return;
-   end if;
+   ---------
+   -- Run --
+   ---------
 
-   declare
+   procedure Run is
       Task_Pool : array (0 .. Args.Jobs.Get - 1) of Main_Task_Type;
    begin
-
-      if Args.No_Lookup_Cache.Get then
-         Disable_Lookup_Cache (True);
+      if Task_Pool'Length = 0 then
+         Put_Line ("Invalid number of jobs: at least one is needed");
+         Exit_Status := Ada.Command_Line.Failure;
+         return;
       end if;
 
+      Disable_Lookup_Cache (Args.No_Lookup_Cache.Get);
+
       if Args.Trace.Get then
          Set_Debug_State (Trace);
       elsif Args.Debug.Get then
@@ -805,9 +1110,8 @@ begin
       if Length (Args.Project_File.Get) > 0 then
          declare
             Filename : constant String := +Args.Project_File.Get;
-            Env      : Project_Environment_Access;
-            Project  : constant Project_Tree_Access := new Project_Tree;
          begin
+            Project := new Project_Tree;
             Initialize (Env);
 
             --  Set scenario variables
@@ -821,8 +1125,7 @@ begin
                   end loop;
                   if Eq_Index not in A'Range then
                      Put_Line ("Invalid scenario variable: -X" & A);
-                     Ada.Command_Line.Set_Exit_Status
-                       (Ada.Command_Line.Failure);
+                     Exit_Status := Ada.Command_Line.Failure;
                      return;
                   end if;
                   Change_Environment
@@ -833,7 +1136,8 @@ begin
             end loop;
 
             Load (Project.all, Create (+Filename), Env);
-            UFP := Create_Project_Unit_Provider_Reference (Project, Env);
+            UFP := Create_Project_Unit_Provider_Reference
+              (Project, Env, Is_Project_Owner => False);
 
             if Args.Files_From_Project.Get then
                Add_Files_From_Project (Project, Project.Root_Project, Files);
@@ -862,24 +1166,141 @@ begin
       --  Main logic
       --
 
+      --  Use several chunks per job so that the load remains balanced when
+      --  some files take much longer to process than others. All chunks are
+      --  queued before jobs start, so that jobs can stop as soon as the queue
+      --  is empty.
+
+      declare
+         Chunk_Size : constant Positive :=
+            Positive'Max (1, Natural (Files.Length) / (Task_Pool'Length * 4));
+         Chunk      : String_Vectors.Vector;
+      begin
+         for F of Files loop
+            Chunk.Append (F);
+            if Natural (Chunk.Length) = Chunk_Size then
+               Queue.Enqueue (Chunk);
+               Chunk.Clear;
+            end if;
+         end loop;
+         if not Chunk.Is_Empty then
+            Queue.Enqueue (Chunk);
+         end if;
+      end;
+
       for T of Task_Pool loop
          T.Create_Context (UFP);
       end loop;
 
-      for F of Files loop
-         Queue.Enqueue (F);
-      end loop;
-
       for T of Task_Pool loop
          T.Stop;
       end loop;
-   end;
 
-   Show_Stats;
-
-   Put_Line ("Done.");
-exception
-   when others =>
       Show_Stats;
-      raise;
+      Show_Slowest_Nodes;
+
+      Put_Line ("Done.");
+   exception
+      when others =>
+         Show_Stats;
+         raise;
+   end Run;
+
+   ---------------
+   -- Run_Batch --
+   ---------------
+
+   procedure Run_Batch is
+      package J renames GNATCOLL.JSON;
+      use Ada.Text_IO;
+
+      Output_File : File_Type;
+   begin
+      while not End_Of_File (Standard_Input) loop
+         declare
+            Request   : constant J.JSON_Value :=
+              J.Read (Get_Line (Standard_Input));
+            Dir       : constant String := Request.Get ("dir");
+            Output    : constant String := Request.Get ("output");
+            Arg_Array : constant J.JSON_Array := Request.Get ("args");
+            Arguments : XString_Array (1 .. J.Length (Arg_Array));
+            Response  : constant J.JSON_Value := J.Create_Object;
+         begin
+            for I in Arguments'Range loop
+               Arguments (I) :=
+                 To_XString (String'(J.Get (J.Get (Arg_Array, I))));
+            end loop;
+
+            Ada.Directories.Set_Directory (Dir);
+            Create (Output_File, Out_File, Output);
+            Set_Output (Output_File);
+            Set_Error (Output_File);
+
+            Reset_State;
+            begin
+               if Args.Parser.Parse (Arguments) then
+                  Run;
+               else
+                  Exit_Status := Ada.Command_Line.Failure;
+               end if;
+            exception
+               when E : others =>
+                  --  Mimic what the GNAT runtime prints for unhandled
+                  --  exceptions, so that the output is the same as when
+                  --  running nameres once per test.
+
+                  declare
+                     Msg : constant String :=
+                       Ada.Exceptions.Exception_Message (E);
+                  begin
+                     New_Line (Current_Error);
+                     Put (Current_Error,
+                          "raised " & Ada.Exceptions.Exception_Name (E));
+                     if Msg'Length > 0 then
+                        Put (Current_Error, " : " & Msg);
+                     end if;
+                     New_Line (Current_Error);
+                  end;
+                  Exit_Status := Ada.Command_Line.Failure;
+            end;
+
+            --  Release the project right away rather than keeping it loaded
+            --  until the next test.
+
+            Free_Project;
+
+            Set_Output (Standard_Output);
+            Set_Error (Standard_Error);
+            Close (Output_File);
+
+            Put_Line (Standard_Error, Batch_Stderr_End);
+            Flush (Standard_Error);
+
+            Response.Set_Field ("status", Integer (Exit_Status));
+            Ada.Text_IO.Put_Line (Response.Write);
+            Flush;
+         end;
+      end loop;
+   end Run_Batch;
+
+begin
+
+   --  Setup traces from config file
+   GNATCOLL.Traces.Parse_Config_File;
+
+   --
+   --  Set up of file & project data from command line arguments
+   --
+
+   if not Args.Parser.Parse then
+      return;
+   end if;
+
+   if Args.Batch.Get then
+      Run_Batch;
+   else
+      Run;
+   end if;
+
+   Ada.Command_Line.Set_Exit_Status (Exit_Status);
 end Nameres;
@@ -53,13 +53,63 @@ def decode_boolean_literal(node):
         ))
 
 
-def resolve_node(node, show_slocs=True):
-    def print_nodes(n):
-        if n.is_a(lal.Expr) and (not n.is_a(lal.Name) or not n.p_is_defining):
+def resolve_xrefs(node):
+    """
+    Resolve xrefs for the ``node`` xref entry point. Return its list of xref
+    entries, or the property error raised while computing them.
+    """
+    try:
+        return node.p_resolve_xrefs(args.imprecise_fallback)
+    except lal.PropertyError as exc:
+        return exc
+
+
+def resolve_all_xrefs(node, entry_points):
+    """
+    Resolve xrefs for all the xref entry points in ``node`` at once. Return a
+    list that contains, for each xref entry point in ``entry_points`` (which
+    must be all the ones in ``node``, in prefix order), what
+    ``resolve_xrefs`` returns for it.
+    """
+    try:
+        entries = node.p_resolve_all_xrefs(args.imprecise_fallback)
+    except lal.PropertyError:
+        # Resolve entry points one by one to report errors where they occur
+        return [resolve_xrefs(ep) for ep in entry_points]
+
+    result = [[] for _ in entry_points]
+    i = 0
+    for entry in entries:
+        while entry_points[i] != entry.entry_point:
+            i += 1
+        result[i].append(entry)
+    return result
+
+
+def resolve_node(node, entries, show_slocs=True):
+    """
+    Print the result of name resolution for the ``node`` xref entry point,
+    given what ``resolve_xrefs`` returns for it.
+    """
+    assert node.p_xref_entry_point
+
+    print_title('*', "Resolving xrefs for node {}".format(node))
+
+    # If --imprecise-fallback, entries are available even if p_resolve_names
+    # has failed.
+    if isinstance(entries, lal.PropertyError):
+        print("Property error for node {}: {}".format(node, entries))
+    elif entries and not entries[0].success and not args.imprecise_fallback:
+        print("Resolution failed for node {}".format(node))
+    else:
+        # If it worked, print the reference value and the type value of
+        # every sub expression in the node.
+        for entry in entries:
+            n = entry.node
             print('Expr: {}'.format(n))
 
             if n.is_a(lal.Name):
-                decl_name = n.p_xref(args.imprecise_fallback)
+                decl_name = entry.ref
 
                 refd_decl_img = (
                     entity_repr(decl_name)
@@ -68,33 +118,12 @@ def resolve_node(node, show_slocs=True):
                 )
                 print('  references: {}'.format(refd_decl_img))
 
-            decl = n.p_expression_type
+            decl = entry.expr_type
             decl_image = (entity_repr(decl)
                           if show_slocs or not decl else
                           decl.p_unique_identifying_name)
             print('  type:       {}'.format(decl_image))
 
-        if ((n.p_xref_entry_point and n != node) or
-                (n.is_a(lal.DefiningName) and not n.p_xref_entry_point)):
-            return
-        else:
-            for c in n:
-                if c is not None:
-                    print_nodes(c)
-
-    assert node.p_xref_entry_point
-
-    print_title('*', "Resolving xrefs for node {}".format(node))
-
-    # Perform name resolution on the node, using the p_resolve_names property
-    # If --imprecise-fallback, proceed even if p_resolve_names has failed.
-    if node.p_resolve_names or args.imprecise_fallback:
-        # If it worked, print the reference value and the type value of
-        # every sub expression in the node.
-        print_nodes(node)
-    else:
-        print("Resolution failed for node {}".format(node))
-
     print('')
 
 parser = argparse.ArgumentParser()
@@ -107,6 +136,11 @@ parser.add_argument('--discard-errors-in-populate-lexical-env', '-d',
 parser.add_argument('--project', '-P', type=str)
 parser.add_argument('--auto-dir', action='append')
 parser.add_argument('--imprecise-fallback', action='store_true')
+parser.add_argument('--profile-json', type=str, metavar='FILE',
+                    help='Write per-property profiling data to FILE, as JSON')
+parser.add_argument('--profile-flamegraph', type=str, metavar='FILE',
+                    help='Write per-property profiling data to FILE, as'
+                         ' collapsed stacks for flamegraph.pl')
 args = parser.parse_args()
 
 input_sources = args.files
@@ -132,6 +166,10 @@ ctx = lal.AnalysisContext(charset, unit_provider=provider)
 ctx.discard_errors_in_populate_lexical_env(
     args.discard_errors_in_populate_lexical_env
 )
+
+if args.profile_json or args.profile_flamegraph:
+    ctx.enable_property_profiling()
+
 for src_file in input_sources:
     print_title('#', 'Analyzing {}'.format(src_file))
 
@@ -201,7 +239,8 @@ for src_file in input_sources:
 
         elif pragma_name == u'Test_Statement':
             assert len(p.f_args) == 0
-            resolve_node(p.previous_sibling)
+            resolve_node(p.previous_sibling,
+                         resolve_xrefs(p.previous_sibling))
             empty = False
 
         elif pragma_name == u'Test_Statement_UID':
@@ -211,7 +250,8 @@ for src_file in input_sources:
             # runtime things).
 
             assert len(p.f_args) == 0
-            resolve_node(p.previous_sibling, show_slocs=False)
+            resolve_node(p.previous_sibling,
+                         resolve_xrefs(p.previous_sibling), show_slocs=False)
             empty = False
 
         elif pragma_name == u'Test_Block':
@@ -220,12 +260,24 @@ for src_file in input_sources:
                      if p.parent.parent.is_a(lal.CompilationUnit)
                      else p.previous_sibling)
 
-            for statement in block.findall(lambda n: n.p_xref_entry_point):
-                resolve_node(statement)
+            statements = block.findall(lambda n: n.p_xref_entry_point)
+            for statement, entries in zip(
+                statements, resolve_all_xrefs(block, statements)
+            ):
+                resolve_node(statement, entries)
             empty = False
 
     if not empty:
         print('')
 
 
+profiler = ctx.disable_property_profiling()
+if profiler:
+    if args.profile_json:
+        with open(args.profile_json, 'w') as f:
+            profiler.dump_json(f)
+    if args.profile_flamegraph:
+        with open(args.profile_flamegraph, 'w') as f:
+            profiler.dump_flamegraph(f)
+
 print('Done.')
@@ -23,6 +23,13 @@ def in_contrib(*args):
     return os.path.join(LAL_ROOTDIR, 'contrib', *args)
 
 
+def in_utils(*args):
+    """
+    Return a path under the "utils" subdir in the top of the repository.
+    """
+    return os.path.join(LAL_ROOTDIR, 'utils', *args)
+
+
 def gprbuild(project_file):
     """
     Invoke gprbuild on the given project file.
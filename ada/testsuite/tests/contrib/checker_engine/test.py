@@ -0,0 +1,65 @@
+from __future__ import absolute_import, division, print_function
+
+import os.path
+import shutil
+import sys
+import tempfile
+
+from utils import in_contrib
+
+
+sys.path.append(in_contrib())
+import checker_engine
+checker_engine.main(checker_engine.parser.parse_args(['foo.adb']))
+
+# Results must not depend on the number of worker processes
+checker_engine.main(checker_engine.parser.parse_args(
+    ['--jobs', '2', 'foo.adb']))
+
+# Findings replayed from the cache must be the same as the computed ones
+cache_dir = tempfile.mkdtemp()
+try:
+    for _ in range(2):
+        checker_engine.main(checker_engine.parser.parse_args(
+            ['--cache', cache_dir, 'foo.adb']))
+finally:
+    shutil.rmtree(cache_dir)
+
+# Statistics are printed on the standard error stream: make them part of the
+# test output, in order.
+sys.stderr = sys.stdout
+
+# Without a cache, there is nothing to count
+checker_engine.main(checker_engine.parser.parse_args(
+    ['--cache-stats', 'foo.adb']))
+
+# On a second run, all findings come from the cache, and editing a file only
+# invalidates the entries for this file.
+work_dir = tempfile.mkdtemp()
+try:
+    cache_dir = os.path.join(work_dir, 'cache')
+    files = [os.path.join(work_dir, 'foo.adb'),
+             os.path.join(work_dir, 'bar.adb')]
+    shutil.copy('foo.adb', files[0])
+    with open(files[1], 'w') as f:
+        f.write('procedure Bar is\nbegin\n   null;\nend Bar;\n')
+
+    def run(label):
+        print('== {} =='.format(label))
+        engine = checker_engine.Engine(
+            checker_engine.load_checkers(checker_engine.CHECKERS),
+            cache_dir=cache_dir
+        )
+        stats = checker_engine.CacheStats(True)
+        for r in stats.count(engine.run(files)):
+            print('{}: {} hits, {} misses'.format(
+                os.path.basename(r.file), r.cache_hits, r.cache_misses))
+        stats.report()
+
+    run('First run')
+    run('Second run')
+    with open(files[1], 'a') as f:
+        f.write('--  Edited\n')
+    run('After editing bar.adb')
+finally:
+    shutil.rmtree(work_dir)
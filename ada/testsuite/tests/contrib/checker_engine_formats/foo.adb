@@ -0,0 +1,20 @@
+procedure Foo is
+
+   ---------
+   -- Bar --
+   ---------
+
+   procedure Baz is
+   begin
+      null;
+   end Baz;
+
+   Y       : Integer := I;
+   Dummy_1 : constant Integer := Y / Y;
+begin
+   if Y = 1 then
+      return;
+   elsif Y = 1 then
+      return;
+   end if;
+end Foo;
@@ -0,0 +1,69 @@
+from __future__ import absolute_import, division, print_function
+
+import json
+import StringIO
+import sys
+
+from utils import in_contrib
+
+
+sys.path.append(in_contrib())
+import checker_engine
+
+
+def run(*args):
+    """
+    Run checker_engine with the given arguments and return its output.
+    """
+    stdout = sys.stdout
+    sys.stdout = StringIO.StringIO()
+    try:
+        checker_engine.main(checker_engine.parser.parse_args(list(args)))
+        return sys.stdout.getvalue()
+    finally:
+        sys.stdout = stdout
+
+
+def check_time(obj):
+    """
+    Check that obj has a "time" entry, and replace it with a constant so that
+    the output is stable.
+    """
+    assert isinstance(obj['time'], float), obj
+    obj['time'] = 0.0
+
+
+def dump(obj):
+    print(json.dumps(obj, indent=2, separators=(',', ': '), sort_keys=True))
+
+
+print('== JSON Lines ==')
+for line in run('--format', 'jsonl', 'foo.adb').splitlines():
+    record = json.loads(line)
+    check_time(record)
+    dump(record)
+print('')
+
+print('== SARIF ==')
+log = json.loads(run('--format', 'sarif', 'foo.adb'))
+
+# Check the structure of locations in results, as SARIF consumers expect it
+sarif_run = log['runs'][0]
+rule_ids = set(rule['id'] for rule in sarif_run['tool']['driver']['rules'])
+for result in sarif_run['results']:
+    assert result['ruleId'] in rule_ids, result
+    assert len(result['locations']) == 1, result
+    loc = result['locations'][0]['physicalLocation']
+    assert loc['artifactLocation']['uri'] in [
+        a['location']['uri'] for a in sarif_run['artifacts']
+    ], result
+    assert isinstance(loc['region']['startLine'], int), result
+    assert isinstance(loc['region']['startColumn'], int), result
+    print('{}: {}:{}:{}'.format(result['ruleId'],
+                                loc['artifactLocation']['uri'],
+                                loc['region']['startLine'],
+                                loc['region']['startColumn']))
+
+for artifact in sarif_run['artifacts']:
+    check_time(artifact['properties'])
+dump(log)
@@ -0,0 +1,94 @@
+"""
+Unit tests for the fact sets of contrib/dataflow.py: variable numbering,
+bitset operations, and undoing the changes made to the table of nodes of
+PathFacts copies when they are closed, including for nested copies.
+"""
+
+from __future__ import absolute_import, division, print_function
+
+import sys
+
+from utils import in_contrib
+
+
+sys.path.append(in_contrib())
+from dataflow import PathFacts, VarIndex, VarSet
+
+
+def names(index, s):
+    return sorted(n for n in index.bits if n in s)
+
+
+def facts(f):
+    return sorted((n, f.node(n)) for n in f.index.bits if n in f)
+
+
+print('== VarIndex ==')
+index = VarIndex()
+print('Bits: {} {} {}'.format(index.bit('x'), index.bit('x.y'),
+                              index.bit('x')))
+index.mask(['y', 'x.z', 'xx'])
+print('Prefix x.: {}'.format(names(index, VarSet(index,
+                                                 index.prefix_mask('x.')))))
+print('Prefix q: {}'.format(index.prefix_mask('q')))
+
+print('== VarSet ==')
+a = VarSet(index)
+a.add('x')
+a.add('x.y')
+a.add('y')
+b = a.copy()
+b.discard('y')
+b.add('xx')
+print('a: {}, b: {}'.format(names(index, a), names(index, b)))
+c = a.copy()
+c.intersection_update(b)
+print('a & b: {}'.format(names(index, c)))
+c = a.copy()
+c.difference_update(b)
+print('a - b: {}'.format(names(index, c)))
+c.update(b)
+print('(a - b) | b: {}'.format(names(index, c)))
+c.discard_prefixed('x.')
+print('without x.*: {}'.format(names(index, c)))
+print('unknown in c: {}'.format('unknown' in c))
+c.discard('unknown')
+c.clear()
+print('cleared: {}, empty: {}'.format(names(index, c),
+                                     names(index, a.empty())))
+
+print('== PathFacts ==')
+root = PathFacts(VarIndex())
+root.add('p', 'deref p (1)')
+root.add('q', 'deref q (2)')
+
+branch = root.copy()
+branch.add('p', 'deref p (3)')
+branch.add('r', 'deref r (4)')
+print('branch: {}'.format(facts(branch)))
+
+nested = branch.copy()
+nested.add('r', 'deref r (5)')
+nested.add('s', 'deref s (6)')
+nested.discard('q')
+print('nested: {}'.format(facts(nested)))
+
+nested.close()
+print('branch after closing nested: {}'.format(facts(branch)))
+print('s in table: {}'.format('s' in branch.nodes))
+
+empty = branch.empty()
+empty.add('t', 'deref t (7)')
+print('empty: {}'.format(facts(empty)))
+empty.close()
+
+branch.close()
+print('root after closing branch: {}'.format(facts(root)))
+print('Table: {}'.format(sorted(root.nodes.items())))
+print('Trail length: {}'.format(len(root.trail)))
+
+# Closing twice is harmless
+branch.close()
+print('root after closing again: {}'.format(facts(root)))
+
+print('Done')
@@ -0,0 +1,28 @@
+procedure A (X : in out Integer; Y : Integer) is
+   Tmp : Integer := 0;
+begin
+   if X > Y then
+      Tmp := X - Y;
+      X := X + Tmp * 2;
+   elsif X < Y then
+      Tmp := Y - X;
+      X := X - Tmp * 3;
+   else
+      Tmp := 1;
+   end if;
+
+   for I in 1 .. Y loop
+      if I mod 2 = 0 then
+         X := X + I;
+      else
+         X := X - I / 2;
+      end if;
+   end loop;
+
+   while X > 100 loop
+      X := X / 2;
+      Tmp := Tmp + 1;
+   end loop;
+
+   X := X + Tmp;
+end A;
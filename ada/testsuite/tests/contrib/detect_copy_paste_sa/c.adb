@@ -0,0 +1,10 @@
+procedure C (S : String; N : out Natural) is
+begin
+   N := 0;
+   for Char of S loop
+      case Char is
+         when 'a' .. 'z' => N := N + 1;
+         when others => null;
+      end case;
+   end loop;
+end C;
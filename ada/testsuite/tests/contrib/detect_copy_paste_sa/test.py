@@ -0,0 +1,57 @@
+"""
+Check that contrib/detect_copy_paste_sa.py reports a subprogram that is
+duplicated across two files, and nothing else.
+
+Only the paths of the reported chunks and whether they cover the duplicated
+subprograms are printed, as the output of the script also contains timings.
+"""
+
+from __future__ import absolute_import, division, print_function
+
+import re
+import StringIO
+import sys
+
+from utils import in_contrib
+
+
+sys.path.append(in_contrib())
+import detect_copy_paste_sa
+
+
+CHUNK_PAIR_RE = re.compile(
+    r'\s*\d+\s+\d+: (\S+)\s+\(\s*(\d+),\s*(\d+)\) ~= (\S+)\s+\(\s*(\d+),'
+    r'\s*(\d+)\)'
+)
+
+# Both files contain the same subprogram on lines 1 to 28
+DUPLICATED_LINES = (1, 28)
+
+
+def covers_subprogram(begin, end):
+    first, last = DUPLICATED_LINES
+    return first <= begin and end <= last and end - begin >= 20
+
+
+sys.argv = ['detect_copy_paste_sa.py', '--min-size=20', '--min-lines=10',
+            'a.adb', 'b.adb', 'c.adb']
+output = StringIO.StringIO()
+sys.stdout = output
+try:
+    detect_copy_paste_sa.main()
+finally:
+    sys.stdout = sys.__stdout__
+
+print('Reported copy-pastes:')
+for line in output.getvalue().splitlines():
+    m = CHUNK_PAIR_RE.match(line)
+    if m:
+        path_1, begin_1, end_1, path_2, begin_2, end_2 = m.groups()
+        print('   {} ~= {}: covers the duplicated subprograms: {}'.format(
+            path_1, path_2,
+            covers_subprogram(int(begin_1), int(end_1))
+            and covers_subprogram(int(begin_2), int(end_2))
+        ))
+    elif line.startswith('Could not parse'):
+        print(line)
+print('Done')
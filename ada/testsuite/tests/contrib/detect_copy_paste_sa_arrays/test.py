@@ -0,0 +1,107 @@
+"""
+Check the suffix array, the LCP array and the set of widest chunk pairs
+computed by contrib/detect_copy_paste_sa.py against naive implementations, on
+small inputs.
+"""
+
+from __future__ import absolute_import, division, print_function
+
+from array import array
+import itertools
+import random
+import sys
+
+from utils import in_contrib
+
+
+sys.path.append(in_contrib())
+from detect_copy_paste_sa import (CodeChunk, CodeChunkPairs, lcp_array,
+                                  suffix_array)
+
+
+def naive_suffix_array(s):
+    return sorted(range(len(s)), key=lambda i: s[i:])
+
+
+def naive_lcp_array(s, sa):
+    def common_prefix(i, j):
+        n = 0
+        while i + n < len(s) and j + n < len(s) and s[i + n] == s[j + n]:
+            n += 1
+        return n
+
+    return [common_prefix(sa[i], sa[i + 1])
+            for i in range(len(sa) - 1)] + [0] * min(len(sa), 1)
+
+
+def check_arrays(s, k):
+    """
+    Return whether the suffix and LCP arrays for the sequence ``s`` of
+    integers in [1, k] are the same as the naive ones.
+    """
+    sa = suffix_array(array('l', s), k)
+    return (list(sa) == naive_suffix_array(s)
+            and list(lcp_array(array('l', s), sa))
+            == naive_lcp_array(s, list(sa)))
+
+
+def inputs():
+    # All the sequences of up to 8 items over small alphabets
+    for k in (1, 2, 3):
+        for n in range(9 if k < 3 else 7):
+            for s in itertools.product(range(1, k + 1), repeat=n):
+                yield list(s), k
+
+    # Random sequences, with a few items that are much more frequent than the
+    # others, as in encoded code.
+    rng = random.Random(0)
+    for _ in range(500):
+        k = rng.randint(1, 50)
+        frequent = [rng.randint(1, k) for _ in range(3)]
+        yield [rng.choice(frequent) if rng.random() < 0.7
+               else rng.randint(1, k)
+               for _ in range(rng.randint(0, 200))], k
+
+
+print('== Suffix and LCP arrays ==')
+failures = [(s, k) for s, k in inputs() if not check_arrays(s, k)]
+print('Mismatches: {}'.format(failures[:5]))
+
+
+def naive_add(pairs, pair):
+    first, second = pair
+    if any(p[0].is_wider_than(first) and p[1].is_wider_than(second)
+           for p in pairs):
+        return
+    pairs[:] = [p for p in pairs
+                if not (first.is_wider_than(p[0])
+                        and second.is_wider_than(p[1]))]
+    pairs.append(pair)
+
+
+def key(pair):
+    return tuple((c.begin, c.end) for c in pair)
+
+
+def random_chunk(rng, path):
+    begin = rng.randint(1, 60)
+    return CodeChunk(path, begin, begin + rng.randint(0, 15), 1)
+
+
+print('== Chunk pairs ==')
+rng = random.Random(0)
+mismatches = 0
+for _ in range(300):
+    pairs = CodeChunkPairs()
+    expected = []
+    for _ in range(rng.randint(1, 40)):
+        pair = (random_chunk(rng, 'a.adb'), random_chunk(rng, 'b.adb'))
+        pairs.add(pair)
+        naive_add(expected, pair)
+    if (sorted(key(p) for p in pairs) != sorted(key(p) for p in expected)
+            or [p[0].begin for p in pairs]
+            != sorted(p[0].begin for p in pairs)):
+        mismatches += 1
+print('Mismatches: {}'.format(mismatches))
+
+print('Done')
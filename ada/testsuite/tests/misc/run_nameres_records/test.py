@@ -0,0 +1,45 @@
+from __future__ import absolute_import, division, print_function
+
+import sys
+
+from utils import in_utils
+
+
+sys.path.append(in_utils())
+from run_nameres import FileResult
+
+
+# Output of "nameres --json" for two files, the second one crashing, as
+# captured from a run with --slowest-nodes.
+output = '''\
+################
+# Analyzing foo.adb #
+################
+{"kind": "node_resolution", "file": "foo.adb", "sloc": "3:4-3:10", \
+"success": true}
+{"kind": "node_resolution", "file": "foo.adb", "sloc": "4:4-4:12", \
+"success": false}
+{"kind": "file_analysis", "file": "foo.adb", "time": 0.25}
+{"kind": "node_resolution", "file": "bar.adb", "sloc": "2:4-2:9", \
+"success": false, "exception_message": "Property_Error", \
+"exception_traceback": "libadalang.ads:1"}
+{"kind": "file_analysis", "file": "bar.adb", "time": 1.5, \
+"exception_message": "Constraint_Error"}
+{"kind": "node_resolution", "file": "baz.adb", "sloc": "1:1-1:5", \
+"success": true}
+{"kind": "slowest_nodes", "nodes": [{"file": "bar.adb", "sloc": "2:4-2:9", \
+"time": 1.25}]}
+Done.
+'''
+
+pending = {}
+for file_result in FileResult.read_records(
+    output.splitlines(), lambda f: FileResult(f, '.'), pending
+):
+    print('{}: duration={} crashed={} successes={}'.format(
+        file_result.file_name, file_result.duration,
+        file_result.has_crashed, len(file_result.successes)
+    ))
+    for f in file_result.failures:
+        print('  failure at {}: {}'.format(f.node, f.exception))
+print('Pending: {}'.format(', '.join(sorted(pending))))
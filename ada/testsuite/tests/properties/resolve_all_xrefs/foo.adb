@@ -0,0 +1,13 @@
+procedure Foo is
+   type Rec is record
+      A, B : Integer;
+   end record;
+
+   function Double (I : Integer) return Integer is (I * 2);
+
+   X : Integer := 1;
+   R : Rec := (X, Double (X));
+begin
+   X := X + Double (R.A);
+   Unknown (X);
+end Foo;
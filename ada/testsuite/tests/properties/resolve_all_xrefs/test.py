@@ -0,0 +1,69 @@
+"""
+Test that AdaNode.p_resolve_xrefs and AdaNode.p_resolve_all_xrefs return the
+same results as calling p_resolve_names, p_xref and p_expression_type on each
+node.
+"""
+
+from __future__ import absolute_import, division, print_function
+
+import libadalang as lal
+
+
+ctx = lal.AnalysisContext()
+unit = ctx.get_from_file('foo.adb')
+
+
+def per_node_entries(entry_point):
+    """
+    Compute xref entries for ``entry_point`` the way the nameres script does.
+    """
+    success = entry_point.p_resolve_names
+    if not success:
+        return [(entry_point, None, None, entry_point, False)]
+
+    result = []
+
+    def visit(n):
+        if n.is_a(lal.Expr) and not (n.is_a(lal.Name) and n.p_is_defining):
+            result.append((
+                n,
+                n.p_xref() if n.is_a(lal.Name) else None,
+                n.p_expression_type,
+                entry_point,
+                success
+            ))
+        if ((n.p_xref_entry_point and n != entry_point) or
+                (n.is_a(lal.DefiningName) and not n.p_xref_entry_point)):
+            return
+        for c in n:
+            if c is not None:
+                visit(c)
+
+    visit(entry_point)
+    return result
+
+
+def tuples(entries):
+    return [(e.node, e.ref, e.expr_type, e.entry_point, e.success)
+            for e in entries]
+
+
+expected = []
+per_entry_point = []
+for ep in unit.root.findall(lambda n: n.p_xref_entry_point):
+    expected.extend(per_node_entries(ep))
+    per_entry_point.extend(tuples(ep.p_resolve_xrefs()))
+
+actual = tuples(unit.root.p_resolve_all_xrefs())
+
+print('Failures: {}'.format(', '.join(
+    n.text for n, _, _, _, success in actual if not success
+)))
+print('Same results: {}'.format(actual == expected))
+print('Same results per entry point: {}'.format(per_entry_point == expected))
+
+try:
+    unit.root.p_resolve_xrefs()
+except lal.PropertyError:
+    print('resolve_xrefs on a non entry point: PropertyError')
+print('Done')
@@ -0,0 +1,5 @@
+procedure Foo is
+   X : Integer := 1;
+begin
+   X := X + 1;
+end Foo;
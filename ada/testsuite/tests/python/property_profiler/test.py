@@ -0,0 +1,46 @@
+"""
+Test that PropertyProfiler records calls to public properties and restores
+the original node classes when disabled, including when it is driven from
+the analysis context.
+"""
+
+from __future__ import absolute_import, division, print_function
+
+import libadalang as lal
+
+
+ctx = lal.AnalysisContext()
+unit = ctx.get_from_file('foo.adb')
+assign = unit.root.find(lal.AssignStmt)
+ids = assign.findall(lal.Identifier)
+
+with lal.PropertyProfiler() as prof:
+    assign.p_resolve_names
+    for i in ids:
+        i.p_xref()
+
+for name, stats in sorted(prof.stats.items()):
+    print('{}: {} call(s)'.format(name.split('.')[1], stats['calls']))
+    assert stats['self_time'] <= stats['cumulative_time'] + 1e-6
+
+# Calls made once the profiler is disabled must not be recorded
+ids[0].p_xref()
+print('Recorded calls: {}'.format(
+    sum(s['calls'] for s in prof.stats.values())
+))
+
+for stack in sorted(prof.stacks):
+    print(';'.join(name.split('.')[1] for name in stack))
+
+# Profiling can also be driven from the analysis context
+print('Profiler before: {}'.format(ctx.property_profiler))
+prof = ctx.enable_property_profiling()
+print('Same profiler: {}'.format(ctx.property_profiler is prof))
+ids[1].p_xref()
+print('Disabled profiler: {}'.format(ctx.disable_property_profiling() is prof))
+print('Profiler after: {}'.format(ctx.property_profiler))
+print('Recorded calls: {}'.format(
+    sum(s['calls'] for s in prof.stats.values())
+))
+
+print('Done')
@@ -0,0 +1,6 @@
+package body D is
+   function Get_T return T is
+   begin
+      return (null record);
+   end Get_T;
+end D;
@@ -0,0 +1,86 @@
+"""
+Test that XrefIndex answers find_all_references queries like the
+corresponding property, survives a save/load round-trip and detects stale
+units after a reparse.
+"""
+
+from __future__ import absolute_import, division, print_function
+
+import os
+import sys
+
+import libadalang as lal
+
+
+ctx = lal.AnalysisContext(unit_provider=lal.UnitProvider.auto(sys.argv[1:]))
+all_units = [
+    ctx.get_from_file(f) for f in sys.argv[1:]
+]
+
+
+def find_name(unit_name, name_text):
+    unit = ctx.get_from_file(unit_name)
+    return unit.root.find(
+        lambda x: x.is_a(lal.DefiningName) and x.text == name_text
+    )
+
+
+index = lal.XrefIndex(ctx, 'xref.idx')
+print('Indexed units: {}'.format(index.update(all_units)))
+index.save()
+
+index = lal.XrefIndex(ctx, 'xref.idx')
+print('Indexed units after reload: {}'.format(index.update(all_units)))
+
+for unit, name in [('a.ads', 'X'), ('a.adb', 'Get_X'), ('a.ads', 'Rec_Type'),
+                   ('b.adb', 'Make_Rec_1'), ('d.ads', 'T')]:
+    dn = find_name(unit, name)
+    refs = index.find_all_references(dn, all_units)
+    print('All references to {} from {}:'.format(name, unit))
+    for ref in refs:
+        print('    {} ({}, {})'.format(
+            ref.text, os.path.basename(ref.unit.filename), ref.sloc_range
+        ))
+    assert refs == dn.p_find_all_references(all_units)
+
+print('Calls to Make_Rec_1:')
+for ref in index.is_called_by(find_name('b.adb', 'Make_Rec_1'), all_units):
+    print('    {} ({}, {})'.format(
+        ref.text, os.path.basename(ref.unit.filename), ref.sloc_range
+    ))
+
+# Unit hashes are cached: a repeated query must not compute them again
+hashed_units = []
+unit_hash = lal.XrefIndex.unit_hash
+
+
+def counting_unit_hash(unit):
+    hashed_units.append(unit.filename)
+    return unit_hash(unit)
+
+
+lal.XrefIndex.unit_hash = staticmethod(counting_unit_hash)
+index.find_all_references(find_name('a.ads', 'X'), all_units)
+print('Units hashed by a repeated query: {}'.format(len(hashed_units)))
+
+# Reparsing a unit must make the index stale for it and for the units that
+# reference it.
+a_spec = ctx.get_from_file('a.ads')
+a_spec.reparse(a_spec.root.text.replace('private', '\nprivate'))
+print('a.ads fresh: {}'.format(index.is_fresh(a_spec)))
+print('b.ads fresh: {}'.format(index.is_fresh(ctx.get_from_file('b.ads'))))
+print('d.ads fresh: {}'.format(index.is_fresh(ctx.get_from_file('d.ads'))))
+print('Query on stale index: {}'.format(
+    index.find_all_references(find_name('a.ads', 'X'), all_units)
+))
+print('Units hashed after the reparse: {}'.format(
+    sorted(set(os.path.basename(f) for f in hashed_units))
+))
+print('Reindexed units: {}'.format(index.update(all_units)))
+dn = find_name('a.ads', 'X')
+print('Fallback helper agrees: {}'.format(
+    dn.find_all_references(all_units, index)
+    == dn.p_find_all_references(all_units)
+))
+
+print('Done')
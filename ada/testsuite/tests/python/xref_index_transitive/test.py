@@ -0,0 +1,61 @@
+"""
+Test that XrefIndex entries depend on the whole import closure of units:
+editing a unit that is only transitively imported must make the index stale,
+for instance when it makes a so far unresolved reference resolvable.
+"""
+
+from __future__ import absolute_import, division, print_function
+
+import os
+import sys
+
+import libadalang as lal
+
+
+ctx = lal.AnalysisContext(unit_provider=lal.UnitProvider.auto(sys.argv[1:]))
+all_units = [
+    ctx.get_from_file(f) for f in sys.argv[1:]
+]
+
+
+def find_name(unit_name, name_text):
+    unit = ctx.get_from_file(unit_name)
+    return unit.root.find(
+        lambda x: x.is_a(lal.DefiningName) and x.text == name_text
+    )
+
+
+print('Import closure of r.ads: {}'.format(', '.join(
+    os.path.basename(u.filename)
+    for u in ctx.get_from_file('r.ads').root.p_import_closure
+)))
+
+index = lal.XrefIndex(ctx)
+print('Indexed units: {}'.format(index.update(all_units)))
+
+# R only imports P through Q, and its reference to W cannot be resolved yet:
+# adding the W component to P must still make R stale.
+p_spec = ctx.get_from_file('p.ads')
+p_spec.reparse(p_spec.root.text.replace(
+    'U : Integer;', 'U : Integer;\n      W : Integer;'
+))
+for filename in ('p.ads', 'q.ads', 'r.ads'):
+    print('{} fresh: {}'.format(
+        filename, index.is_fresh(ctx.get_from_file(filename))
+    ))
+
+dn = find_name('p.ads', 'W')
+print('Query on stale index: {}'.format(
+    index.find_all_references(dn, all_units)
+))
+print('Reindexed units: {}'.format(index.update(all_units)))
+
+refs = index.find_all_references(dn, all_units)
+print('All references to W from p.ads:')
+for ref in refs:
+    print('    {} ({}, {})'.format(
+        ref.text, os.path.basename(ref.unit.filename), ref.sloc_range
+    ))
+assert refs == dn.p_find_all_references(all_units)
+
+print('Done')
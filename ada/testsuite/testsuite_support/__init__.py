@@ -69,6 +69,11 @@ class Testsuite(BaseTestsuite):
         self.main.add_option(
             '--skip-internal-tests', action='store_true', default=False,
             help='Skip tests from the internal testsuite')
+        self.main.add_option(
+            '--disable-nameres-batch', action='store_true', default=False,
+            help='Start a new nameres process for each name resolution test'
+                 ' instead of running them on shared processes in batch'
+                 ' mode.')
 
         #
         # Convenience options for developpers
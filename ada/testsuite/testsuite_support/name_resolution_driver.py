@@ -5,7 +5,8 @@ import os
 import os.path
 
 from testsuite_support.base_driver import (BaseDriver, SetupError,
-                                           catch_test_errors)
+                                           TestError, catch_test_errors)
+from testsuite_support import nameres_batch
 from testsuite_support.python_driver import PythonRunner
 
 
@@ -19,6 +20,16 @@ class NameResolutionDriver(BaseDriver):
     def run_python_only(self):
         return self.test_env.get('run_python_only', False)
 
+    @property
+    def use_nameres_batch(self):
+        """
+        Whether to run nameres on a shared process in batch mode rather than
+        starting a new one for this test. Debuggers and Valgrind need a
+        dedicated process.
+        """
+        opts = self.global_env['options']
+        return not (opts.disable_nameres_batch or opts.debug or self.valgrind)
+
     @catch_test_errors
     def tear_up(self):
         super(NameResolutionDriver, self).tear_up()
@@ -64,10 +75,16 @@ class NameResolutionDriver(BaseDriver):
             if self.run_python_only:
                 return
 
-        ada_output = self.run_and_check(
-            ['nameres'] + args,
-            for_debug=True, memcheck=True, append_output=not self.run_python
-        )
+        if self.use_nameres_batch:
+            ada_output = self.run_nameres_batch(
+                args, append_output=not self.run_python
+            )
+        else:
+            ada_output = self.run_and_check(
+                ['nameres'] + args,
+                for_debug=True, memcheck=True,
+                append_output=not self.run_python
+            )
         if not self.run_python:
             return
 
@@ -82,3 +99,29 @@ class NameResolutionDriver(BaseDriver):
                 f.write('The Python driver and the Ada driver did not return'
                         ' the same result:\n')
                 f.write(diff)
+
+    def run_nameres_batch(self, args, append_output=True):
+        """
+        Like run_and_check for nameres with the given arguments, but run it on
+        a nameres process in batch mode from the shared pool.
+        """
+        nameres_output_file = self.working_dir('nameres.out')
+        try:
+            status = nameres_batch.pool.run(self.working_dir(),
+                                            nameres_output_file, args,
+                                            self.timeout)
+        except nameres_batch.NameresBatchError as exc:
+            raise TestError(str(exc))
+
+        output = self.read_file(nameres_output_file)
+        if append_output:
+            with open(self.output_file, 'a') as f:
+                f.write(output)
+
+        if status != 0:
+            self.result.actual_output += (
+                'nameres returned status code {}\n'.format(status))
+            self.result.actual_output += output
+            raise TestError('nameres returned status code {}'.format(status))
+
+        return output
@@ -0,0 +1,171 @@
+from __future__ import absolute_import, division, print_function
+
+import atexit
+import json
+import Queue
+import subprocess
+import threading
+
+
+STDERR_END = '[nameres batch: end of test]'
+"""
+Line that nameres writes on its standard error after each test, so that what
+is written there can be attributed to tests.
+"""
+
+
+class NameresBatchError(Exception):
+    """
+    Raised when a nameres batch process dies or times out while running a
+    test.
+    """
+    pass
+
+
+class NameresBatch(object):
+    """
+    Wrapper around a nameres process running in batch mode: it runs tests
+    sequentially, sparing the cost of starting a new process for each test.
+    """
+
+    def __init__(self):
+        self.process = subprocess.Popen(
+            ['nameres', '--batch'],
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE
+        )
+
+        # nameres redirects the current error file to the test output, but
+        # some messages are written directly to the standard error (by the
+        # GNAT runtime or C code for instance). Collect them for each test,
+        # as the standard error of a nameres process per test would be. Note
+        # that they end up after the rest of the test output (see run).
+        self.stderr_chunks = Queue.Queue()
+        self.stderr_reader = threading.Thread(target=self.read_stderr)
+        self.stderr_reader.daemon = True
+        self.stderr_reader.start()
+
+    def read_stderr(self):
+        """
+        Read the standard error of the process and queue what is written on
+        it for each test.
+        """
+        chunk = []
+        for line in iter(self.process.stderr.readline, ''):
+            if line.endswith(STDERR_END + '\n'):
+                chunk.append(line[:-len(STDERR_END) - 1])
+                self.stderr_chunks.put(''.join(chunk))
+                chunk = []
+            else:
+                chunk.append(line)
+
+    def run(self, working_dir, output_file, args, timeout):
+        """
+        Run nameres with the given arguments in `working_dir`, writing its
+        output to `output_file`, followed by what it wrote directly on its
+        standard error. Return its exit status.
+
+        What nameres writes directly on its standard error is appended at the
+        end of `output_file` rather than interleaved with the rest of the
+        output: the two go through different channels, so their relative
+        order is lost. Run the testsuite with --disable-nameres-batch to get
+        them in order.
+
+        If the test does not complete in `timeout` seconds, kill the process
+        and raise a NameresBatchError. Also raise a NameresBatchError if the
+        process died.
+
+        :type working_dir: str
+        :type output_file: str
+        :type args: list[str]
+        :type timeout: int
+        :rtype: int
+        """
+        timer = threading.Timer(timeout, self.process.kill)
+        timer.start()
+        try:
+            self.process.stdin.write(json.dumps({
+                'dir': working_dir, 'output': output_file, 'args': args
+            }) + '\n')
+            self.process.stdin.flush()
+            response = self.process.stdout.readline()
+        except IOError:
+            response = ''
+        finally:
+            timer.cancel()
+
+        if not response:
+            self.process.kill()
+            self.process.wait()
+            raise NameresBatchError(
+                'nameres batch process died or timed out'
+                ' (status code {})'.format(self.process.returncode)
+            )
+
+        # The end of test marker is written on the standard error before the
+        # response, so it is available (or about to be read).
+        try:
+            stderr = self.stderr_chunks.get(timeout=timeout)
+        except Queue.Empty:
+            self.process.kill()
+            self.process.wait()
+            raise NameresBatchError(
+                'nameres batch process did not mark the end of the test on'
+                ' its standard error'
+            )
+        if stderr:
+            with open(output_file, 'a') as f:
+                f.write(stderr)
+
+        return json.loads(response)['status']
+
+    def close(self):
+        if self.process.poll() is None:
+            self.process.stdin.close()
+            self.process.wait()
+
+
+class NameresBatchPool(object):
+    """
+    Pool of nameres batch processes, shared by all name resolution testcases
+    running in this process. Each testcase borrows an idle process for the
+    duration of its run, so that at most one process per concurrent test is
+    created.
+    """
+
+    def __init__(self):
+        self.idle = Queue.Queue()
+        self.processes = []
+        self.lock = threading.Lock()
+
+    def run(self, working_dir, output_file, args, timeout):
+        """
+        Run a test on an idle batch process (creating one if there is none).
+        See NameresBatch.run.
+        """
+        try:
+            batch = self.idle.get_nowait()
+        except Queue.Empty:
+            batch = NameresBatch()
+            with self.lock:
+                self.processes.append(batch)
+
+        try:
+            status = batch.run(working_dir, output_file, args, timeout)
+        except NameresBatchError:
+            with self.lock:
+                self.processes.remove(batch)
+            raise
+
+        self.idle.put(batch)
+        return status
+
+    def close(self):
+        with self.lock:
+            for batch in self.processes:
+                batch.close()
+            self.processes = []
+
+
+pool = NameresBatchPool()
+atexit.register(pool.close)
@@ -10,9 +10,12 @@ from __future__ import (absolute_import, division, print_function)
 import argparse
 import libadalang as lal
 
+import checker_engine
+
 parser = argparse.ArgumentParser(description=__doc__)
 parser.add_argument('files', help='The files to analyze',
                     type=str, nargs='+', metavar='F')
+checker_engine.add_cache_arguments(parser)
 
 
 def location(node):
@@ -107,30 +110,22 @@ def interesting_oper(op):
     return isinstance(op, (lal.OpOr, lal.OpOrElse))
 
 
-def do_file(f):
-    c = lal.AnalysisContext()
-    unit = c.get_from_file(f)
+NODE_KINDS = (lal.BinOp, )
 
-    if unit.root is None:
-        print('Could not parse {}:'.format(f))
-        for diag in unit.diagnostics:
-            print('   {}'.format(diag))
-            return
 
-    for binop in unit.root.findall(lal.BinOp):
-        if interesting_oper(binop.f_op) and not same_as_parent(binop):
-            res = has_same_operands(binop)
-            if res is not None:
-                op, fst_val, snd_val = res
-                line, col = location(op)
-                print('{}:{}:{}: expression is always true,'
-                      ' "{}" is always different from {} or {}'.format(
-                          f, line, col, op.text, fst_val.text, snd_val.text))
+def check_node(binop, report):
+    if interesting_oper(binop.f_op) and not same_as_parent(binop):
+        res = has_same_operands(binop)
+        if res is not None:
+            op, fst_val, snd_val = res
+            line, col = location(op)
+            report(line, col, 'expression is always true,'
+                   ' "{}" is always different from {} or {}'.format(
+                       op.text, fst_val.text, snd_val.text))
 
 
 def main(args):
-    for f in args.files:
-        do_file(f)
+    checker_engine.run_checker(__name__, args)
 
 
 if __name__ == '__main__':
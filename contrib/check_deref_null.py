@@ -11,9 +11,13 @@ from __future__ import (absolute_import, division, print_function)
 import argparse
 import libadalang as lal
 
+import checker_engine
+from dataflow import PathFacts, VarIndex
+
 parser = argparse.ArgumentParser(description=__doc__)
 parser.add_argument('files', help='The files to analyze',
                     type=str, nargs='+', metavar='F')
+checker_engine.add_cache_arguments(parser)
 
 
 def location(node):
@@ -84,34 +88,34 @@ def get_assignment(expr):
     return None
 
 
-def explore(f, subp):
+def explore(subp, report):
     """
     Explore the content of a subprogram body (which could be also the body of
     an expression function), and detect if an object is tested for
     (dis)equality with null, after being dereferenced, without any possible
     assignment to the object in between.
 
-    Issue a message in that case.
+    Issue a message in that case, through report(line, column, message).
 
     :rtype: none?
     """
     def remove_assign(node, derefs):
         var = get_assignment(node)
-        if var is not None and var.text in derefs:
-            del derefs[var.text]
+        if var is not None:
+            derefs.discard(var.text)
 
     def add_derefs(node, derefs):
         var = get_dereference(node)
         if var is not None:
-            derefs[var.text] = var
+            derefs.add(var.text, var)
 
     def detect_nullity(node, derefs):
         var = get_nullity_test(node)
         if var is not None and var.text in derefs:
-            fst_line, fst_col = location(derefs[var.text])
+            fst_line, fst_col = location(derefs.node(var.text))
             snd_line, snd_col = location(node)
-            print('{}:{}:{}: suspicious test of null value after dereference'
-                  ' at line {}'.format(f, snd_line, snd_col, fst_line))
+            report(snd_line, snd_col, 'suspicious test of null value after'
+                   ' dereference at line {}'.format(fst_line))
 
     def traverse_branch(node, derefs, loop_test):
         """
@@ -121,9 +125,9 @@ def explore(f, subp):
         if node is None:
             return
 
-        # Copy the dictionary of objects dereferenced, as the objects
-        # dereferenced on a path should not be considered as such when paths
-        # join, e.g. after the if-statement.
+        # Copy the set of objects dereferenced, as the objects dereferenced on
+        # a path should not be considered as such when paths join, e.g. after
+        # the if-statement.
         branch_derefs = derefs.copy()
 
         # Call traverse recursively
@@ -132,17 +136,17 @@ def explore(f, subp):
         # Remove those variables which have been redefined in the branch, which
         # we detect by checking whether they are still in the objects
         # dereferenced for the branch or not.
-        for k in derefs.keys():
-            if k not in branch_derefs:
-                del derefs[k]
+        derefs.intersection_update(branch_derefs)
+        branch_derefs.close()
 
     def traverse(node, derefs, loop_test):
         """
         Main recursive traversal procedure.
 
         :param node: Current node in the AST.
-        :param derefs: Dictionary for the objects dereferenced on the path,
-                       mapping their text to the object node in the AST.
+        :param PathFacts derefs: Set for the objects dereferenced on the path,
+                                 mapping their text to the object node in the
+                                 AST.
         :param loop_test: Boolean that is True if node is within a loop test.
         """
         if node is None:
@@ -195,7 +199,9 @@ def explore(f, subp):
         # Reset dereferences for exception handler, as control may come from
         # many sources.
         elif node.is_a(lal.ExceptionHandler):
-            traverse(node.f_stmts, {}, loop_test)
+            handler_derefs = derefs.empty()
+            traverse(node.f_stmts, handler_derefs, loop_test)
+            handler_derefs.close()
 
         # Ignore local subprograms and packages when exploring the enclosing
         # subprogram body.
@@ -212,25 +218,18 @@ def explore(f, subp):
         for sub in node:
             traverse(sub, derefs, loop_test=False)
 
-    traverse_subp_body(subp, {})
+    traverse_subp_body(subp, PathFacts(VarIndex()))
 
 
-def do_file(f):
-    c = lal.AnalysisContext()
-    unit = c.get_from_file(f)
-    if unit.root is None:
-        print('Could not parse {}:'.format(f))
-        for diag in unit.diagnostics:
-            print('   {}'.format(diag))
-            return
+NODE_KINDS = (lal.SubpBody, lal.ExprFunction)
+
 
-    for subp in unit.root.findall((lal.SubpBody, lal.ExprFunction)):
-        explore(f, subp)
+def check_node(subp, report):
+    explore(subp, report)
 
 
 def main(args):
-    for f in args.files:
-        do_file(f)
+    checker_engine.run_checker(__name__, args)
 
 
 if __name__ == '__main__':
@@ -11,10 +11,13 @@ import argparse
 
 import libadalang as lal
 
+import checker_engine
+
 parser = argparse.ArgumentParser(description=__doc__)
 parser.add_argument(
     'files', help='A file to analyze', type=str, nargs='+', metavar='file'
 )
+checker_engine.add_cache_arguments(parser)
 
 
 def location(node):
@@ -56,26 +59,18 @@ def interesting_oper(op):
                        lal.OpPow, lal.OpConcat)
 
 
-def do_file(f):
-    c = lal.AnalysisContext()
-    unit = c.get_from_file(f)
+NODE_KINDS = (lal.BinOp, )
 
-    if unit.root is None:
-        print('Could not parse {}:'.format(f))
-        for diag in unit.diagnostics:
-            print('   {}'.format(diag))
-            return
 
-    for binop in unit.root.findall(lal.BinOp):
-        if interesting_oper(binop.f_op) and has_same_operands(binop):
-            line, col = location(binop)
-            print('{}:{}:{}: left and right operands of "{}" are'
-                  ' identical'.format(f, line, col, binop.f_op.text))
+def check_node(binop, report):
+    if interesting_oper(binop.f_op) and has_same_operands(binop):
+        line, col = location(binop)
+        report(line, col, 'left and right operands of "{}" are'
+               ' identical'.format(binop.f_op.text))
 
 
 def main(args):
-    for f in args.files:
-        do_file(f)
+    checker_engine.run_checker(__name__, args)
 
 
 if __name__ == '__main__':
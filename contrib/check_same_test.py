@@ -10,9 +10,12 @@ from __future__ import (absolute_import, division, print_function)
 import argparse
 import libadalang as lal
 
+import checker_engine
+
 parser = argparse.ArgumentParser(description=__doc__)
 parser.add_argument('files', help='The files to analyze',
                     type=str, nargs='+', metavar='F')
+checker_engine.add_cache_arguments(parser)
 
 
 def location(node):
@@ -57,30 +60,21 @@ def has_same_tests(expr):
             tests[tokens] = test
 
 
-def do_file(f):
-    c = lal.AnalysisContext()
-    unit = c.get_from_file(f)
+NODE_KINDS = (lal.IfStmt, lal.IfExpr)
 
-    if unit.root is None:
-        print('Could not parse {}:'.format(f))
-        for diag in unit.diagnostics:
-            print('   {}'.format(diag))
-            return
 
-    for ifnode in unit.root.findall((lal.IfStmt, lal.IfExpr)):
-        res = has_same_tests(ifnode)
-        if res is not None:
-            fst_test, snd_test = res
-            fst_line, fst_col = location(fst_test)
-            snd_line, snd_col = location(snd_test)
-            print('{}:{}:{}: duplicate test with line {}'.format(
-                f, snd_line, snd_col, fst_line
-            ))
+def check_node(ifnode, report):
+    res = has_same_tests(ifnode)
+    if res is not None:
+        fst_test, snd_test = res
+        fst_line, fst_col = location(fst_test)
+        snd_line, snd_col = location(snd_test)
+        report(snd_line, snd_col,
+               'duplicate test with line {}'.format(fst_line))
 
 
 def main(args):
-    for f in args.files:
-        do_file(f)
+    checker_engine.run_checker(__name__, args)
 
 
 if __name__ == '__main__':
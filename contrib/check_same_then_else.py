@@ -18,9 +18,12 @@ from __future__ import (absolute_import, division, print_function)
 import argparse
 import libadalang as lal
 
+import checker_engine
+
 parser = argparse.ArgumentParser(description=__doc__)
 parser.add_argument('files', help='The files to analyze',
                     type=str, nargs='+', metavar='F')
+checker_engine.add_cache_arguments(parser)
 
 
 def same_tokens(left, right):
@@ -150,29 +153,18 @@ def has_same_blocks(node):
     return duplicates
 
 
-def do_file(f):
-    c = lal.AnalysisContext()
-    unit = c.get_from_file(f)
+NODE_KINDS = (lal.IfStmt, lal.IfExpr, lal.CaseStmt, lal.CaseExpr)
 
-    if unit.root is None:
-        print('Could not parse {}:'.format(f))
-        for diag in unit.diagnostics:
-            print('   {}'.format(diag))
-            return
 
-    for b in unit.root.findall((lal.IfStmt, lal.IfExpr, lal.CaseStmt,
-                                lal.CaseExpr)):
-        duplicates = has_same_blocks(b)
-        for duplicate in duplicates:
-            (fst_line, fst_col), (snd_line, snd_col) = duplicate
-            print('{}:{}:{}: duplicate code already found at line {}'.format(
-                f, snd_line, snd_col, fst_line
-            ))
+def check_node(b, report):
+    for duplicate in has_same_blocks(b):
+        (fst_line, fst_col), (snd_line, snd_col) = duplicate
+        report(snd_line, snd_col,
+               'duplicate code already found at line {}'.format(fst_line))
 
 
 def main(args):
-    for f in args.files:
-        do_file(f)
+    checker_engine.run_checker(__name__, args)
 
 
 if __name__ == '__main__':
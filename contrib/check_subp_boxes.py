@@ -57,8 +57,28 @@ def check_unsync_box(subp_body):
             return t3
 
 
+NODE_KINDS = (lal.SubpBody, )
+
+# Boxes are comments, so we need them in the token stream
+WITH_TRIVIA = True
+
+CHARSET = 'utf-8'
+
+
+def check_node(sb, report):
+    """
+    Entry point for checker_engine: only report malformed boxes, fixing them
+    is done by running this script standalone.
+    """
+    if check_unsync_box(sb):
+        report(sb.sloc_range.start.line, sb.sloc_range.start.column,
+               "Malformed box for subprogram '{}'".format(
+                   sb.f_subp_spec.f_subp_name.f_tok.text
+               ))
+
+
 def main(args):
-    c = lal.AnalysisContext('utf-8')
+    c = lal.AnalysisContext(CHARSET)
 
     for f in args.files:
         # Get the file's content, for error reporting and for fixing
@@ -11,9 +11,13 @@ from __future__ import (absolute_import, division, print_function)
 import argparse
 import libadalang as lal
 
+import checker_engine
+from dataflow import PathFacts, VarIndex
+
 parser = argparse.ArgumentParser(description=__doc__)
 parser.add_argument('files', help='The files to analyze',
                     type=str, nargs='+', metavar='F')
+checker_engine.add_cache_arguments(parser)
 
 
 def location(node):
@@ -92,34 +96,42 @@ def get_assignment(expr):
     return None
 
 
-def explore(f, subp):
+def explore(subp, report):
     """
     Explore the content of a subprogram body (which could be also the body of
     an expression function), and detect if an object is dereferenced after
     being tested for equality with null, without any possible assignment to
     the object in between.
 
-    Issue a message in that case.
+    Issue a message in that case, through report(line, column, message).
 
     :rtype: none?
     """
     def remove_assign(node, nulls):
         var = get_assignment(node)
-        if var is not None and var.text in nulls:
-            del nulls[var.text]
+        if var is not None:
+            nulls.discard(var.text)
 
     def add_nulls(node, nulls, polarity):
         var = get_nullity_test(node, polarity)
         if var is not None:
-            nulls[var.text] = var
+            nulls.add(var.text, var)
+
+    def not_nulls(nulls):
+        """
+        Return a new set for objects known not to be null. Its nodes are never
+        used, so it does not share the table of nodes of `nulls`, only the
+        numbering of variables.
+        """
+        return PathFacts(nulls.index)
 
     def detect_dereference(node, nulls):
         var = get_dereference(node)
         if var is not None and var.text in nulls:
-            fst_line, fst_col = location(nulls[var.text])
+            fst_line, fst_col = location(nulls.node(var.text))
             snd_line, snd_col = location(node)
-            print('{}:{}:{}: dereference of null value after test at line'
-                  ' {}'.format(f, snd_line, snd_col, fst_line))
+            report(snd_line, snd_col, 'dereference of null value after test'
+                   ' at line {}'.format(fst_line))
 
     def traverse_branch(node, nulls, cond=None, neg_cond=None):
         """
@@ -129,15 +141,16 @@ def explore(f, subp):
         if node is None:
             return
 
-        # Copy the dictionary of objects dereferenced, as the objects that are
+        # Copy the set of objects known to be null, as the objects that are
         # null on a path should not be considered as such when paths join,
         # e.g. after the if-statement.
         branch_nulls = nulls.copy()
 
         if cond:
-            collect_nulls(cond, branch_nulls, {}, result=True)
+            collect_nulls(cond, branch_nulls, not_nulls(nulls), result=True)
         if neg_cond:
-            collect_nulls(neg_cond, branch_nulls, {}, result=False)
+            collect_nulls(neg_cond, branch_nulls, not_nulls(nulls),
+                          result=False)
 
         # Call traverse recursively
         traverse(node, branch_nulls)
@@ -145,9 +158,8 @@ def explore(f, subp):
         # Remove those variables which have been redefined in the branch, which
         # we detect by checking whether they are still in the objects known to
         # be null for the branch or not.
-        for k in nulls.keys():
-            if k not in branch_nulls:
-                del nulls[k]
+        nulls.intersection_update(branch_nulls)
+        branch_nulls.close()
 
     def collect_nulls(node, nulls, notnulls, result):
         """
@@ -185,17 +197,16 @@ def explore(f, subp):
         # an object to null, then performed some call that is not taken into
         # account by the checker, then a test that the object is not null.
         # The test should be enough to consider the object not null.
-        for k in notnulls.keys():
-            if k in nulls:
-                del nulls[k]
+        nulls.difference_update(notnulls)
 
     def traverse(node, nulls):
         """
         Main recursive traversal procedure.
 
         :param node: Current node in the AST.
-        :param nulls: Dictionary for the objects equal to null on the path,
-                      mapping their text to the object node in the AST.
+        :param PathFacts nulls: Set for the objects equal to null on the
+                                path, mapping their text to the object node
+                                in the AST.
         """
         if node is None:
             return
@@ -211,7 +222,7 @@ def explore(f, subp):
                 if (node.f_default_expr is None or
                         node.f_default_expr.is_a(lal.NullLiteral)):
                     for id in node.f_ids:
-                        nulls[id.text] = id
+                        nulls.add(id.text, id)
 
         elif isinstance(node, lal.AssignStmt):
             for sub in node:
@@ -223,11 +234,12 @@ def explore(f, subp):
             # the declaration of pointer objects without initializer, which are
             # implicitly set to null.
             if isinstance(node.f_expr, lal.NullLiteral):
-                nulls[node.f_dest.text] = node.f_dest
+                nulls.add(node.f_dest.text, node.f_dest)
 
         elif isinstance(node, lal.PragmaNode) and node.f_id.text == "Assert":
             for assoc in node.f_args:
-                collect_nulls(assoc.f_expr, nulls, {}, result=True)
+                collect_nulls(assoc.f_expr, nulls, not_nulls(nulls),
+                              result=True)
 
         elif isinstance(node, lal.IfStmt):
             traverse(node.f_cond_expr, nulls)
@@ -255,7 +267,7 @@ def explore(f, subp):
         # from the loop body after variables may be reassigned in the loop.
         elif isinstance(node, lal.LoopStmt):
             traverse(node.f_spec, nulls)
-            traverse_branch(node.f_stmts, {})
+            traverse_branch(node.f_stmts, nulls.empty())
             nulls.clear()
 
         elif (isinstance(node, lal.BinOp) and
@@ -271,7 +283,9 @@ def explore(f, subp):
         # Reset null objects for exception handler, as control may come from
         # many sources.
         elif isinstance(node, lal.ExceptionHandler):
-            traverse(node.f_stmts, {})
+            handler_nulls = nulls.empty()
+            traverse(node.f_stmts, handler_nulls)
+            handler_nulls.close()
 
         # Ignore local subprograms and packages when exploring the enclosing
         # subprogram body.
@@ -292,25 +306,18 @@ def explore(f, subp):
         for sub in node:
             traverse(sub, nulls)
 
-    traverse_subp_body(subp, {})
+    traverse_subp_body(subp, PathFacts(VarIndex()))
 
 
-def do_file(f):
-    c = lal.AnalysisContext()
-    unit = c.get_from_file(f)
-    if unit.root is None:
-        print('Could not parse {}:'.format(f))
-        for diag in unit.diagnostics:
-            print('   {}'.format(diag))
-            return
+NODE_KINDS = (lal.SubpBody, lal.ExprFunction)
+
 
-    for subp in unit.root.findall((lal.SubpBody, lal.ExprFunction)):
-        explore(f, subp)
+def check_node(subp, report):
+    explore(subp, report)
 
 
 def main(args):
-    for f in args.files:
-        do_file(f)
+    checker_engine.run_checker(__name__, args)
 
 
 if __name__ == '__main__':
@@ -63,9 +63,13 @@ from __future__ import (absolute_import, division, print_function)
 import argparse
 import libadalang as lal
 
+import checker_engine
+from dataflow import PathFacts, VarIndex, VarSet
+
 parser = argparse.ArgumentParser(description=__doc__)
 parser.add_argument('files', help='The files to analyze',
                     type=str, nargs='+', metavar='F')
+checker_engine.add_cache_arguments(parser)
 
 
 def location(node):
@@ -213,7 +217,7 @@ def is_local_subprogram(node, locsubprograms):
         return False
 
 
-def explore(f, locvars, locsubprograms, subp):
+def explore(locvars, locsubprograms, subp, report):
     """
     Explore the content of a subprogram body, and detect if an assignment to a
     local variable is useless, either because it is reassigned with no possible
@@ -221,7 +225,7 @@ def explore(f, locvars, locsubprograms, subp):
     variable is read. In the first case, the reassignment must be at the same
     scope level, or in a scope above, the initial assignment.
 
-    Issue a message in both cases.
+    Issue a message in both cases, through report(line, column, message).
 
     We do this by traversing the AST in reverse order, maintaining two pieces
     of information:
@@ -250,21 +254,24 @@ def explore(f, locvars, locsubprograms, subp):
     params = set([param.f_ids.text
                   for param in subp.f_subp_spec.p_params])
 
+    # Sets of access paths are stored as bitsets, using the following
+    # numbering for access paths.
+    index = VarIndex()
+    params_mask = index.mask(params)
+    locvars_mask = index.mask(locvars.keys())
+
     def remove_read(node, assigns, reads):
         obj = get_read(node)
         if obj is not None:
             if (is_local_var(obj, locvars) and
                     is_variable_or_record_path(obj)):
                 reads.add(obj.text)
-                if obj.text in assigns:
-                    del assigns[obj.text]
+                assigns.discard(obj.text)
             # If not itself the prefix of a record access path like X.Y.Z,
             # consider that a read of X.Y after and before successive
             # assignments to X.Y.Z is enough to validate them.
             if not isinstance(obj.parent, lal.DottedName):
-                for path in assigns.keys():
-                    if path.startswith(obj.text):
-                        del assigns[path]
+                assigns.discard_prefixed(obj.text)
 
     def detect_reassign(node, assigns, reads):
         if isinstance(node, lal.AssignStmt):
@@ -273,10 +280,10 @@ def explore(f, locvars, locsubprograms, subp):
             if is_local_var(obj, locvars) and is_variable_or_record_path(obj):
                 if obj.text in assigns:
                     fst_line, fst_col = location(obj)
-                    snd_line, snd_col = location(assigns[obj.text])
-                    print('{}:{}:{}: useless assignment,'
-                          ' {} reassigned at line {}'.format(
-                              f, fst_line, fst_col, obj.text, snd_line))
+                    snd_line, snd_col = location(assigns.node(obj.text))
+                    report(fst_line, fst_col, 'useless assignment,'
+                           ' {} reassigned at line {}'.format(
+                               obj.text, snd_line))
 
                 # Without semantic information, we cannot know if assignment to
                 # X.C is through a pointer X to memory. So currently only
@@ -284,13 +291,12 @@ def explore(f, locvars, locsubprograms, subp):
                 elif (isinstance(obj, lal.Identifier) and
                         obj.text not in reads):
                     fst_line, fst_col = location(obj)
-                    print('{}:{}:{}: useless assignment,'
-                          ' {} not read before return'.format(
-                              f, fst_line, fst_col, obj.text))
+                    report(fst_line, fst_col, 'useless assignment,'
+                           ' {} not read before return'.format(obj.text))
 
     def declare_assign(node, assigns):
         if is_local_var(node, locvars):
-            assigns[node.text] = node
+            assigns.add(node.text, node)
 
     def traverse_branch(node,
                         init_assigns, update_assigns,
@@ -300,17 +306,17 @@ def explore(f, locvars, locsubprograms, subp):
         traverse on branches in the control flow.
 
         :param lal.AdaNode node: Node for a branch in the AST.
-        :param map init_assigns: Initial value of the assignment map.
-        :param map update_assigns: Assignment map to update as a result of the
-                                   branch traversal.
-        :param set init_reads: Initial value of the set of reads.
-        :param set update_reads: Set of reads to update as a result of the
-                                 branch traversal.
+        :param PathFacts init_assigns: Initial value of the assignment map.
+        :param PathFacts update_assigns: Assignment map to update as a result
+                                         of the branch traversal.
+        :param VarSet init_reads: Initial value of the set of reads.
+        :param VarSet update_reads: Set of reads to update as a result of the
+                                    branch traversal.
         """
         if node is None:
             return
 
-        # Copy the dictionary of objects assigned, as the objects that are
+        # Copy the set of objects assigned, as the objects that are
         # assigned on a path should not be considered as such when paths join,
         # e.g. when moving from a branch of an if-statement to before it.
         branch_assigns = init_assigns.copy()
@@ -324,12 +330,11 @@ def explore(f, locvars, locsubprograms, subp):
         # Remove those variables which have been read in the branch, which
         # we detect by checking whether they are still in the objects known to
         # be assigned for the branch or not.
-        for k in update_assigns.keys():
-            if k not in branch_assigns:
-                del update_assigns[k]
+        update_assigns.intersection_update(branch_assigns)
+        branch_assigns.close()
 
         # Join the object read on the branch
-        update_reads |= branch_reads
+        update_reads.update(branch_reads)
 
     def traverse(node, assigns, reads):
         """
@@ -337,9 +342,9 @@ def explore(f, locvars, locsubprograms, subp):
         order.
 
         :param lal.AdaNode node: Current node in the AST.
-        :param map assigns: Dictionary for the local objects assigned on the
+        :param PathFacts assigns: Set for the local objects assigned on the
             path, mapping their text to the object node in the AST.
-        :param set reads: Set for the local objects read on the path.
+        :param VarSet reads: Set for the local objects read on the path.
         """
         if node is None:
             return
@@ -387,15 +392,17 @@ def explore(f, locvars, locsubprograms, subp):
         # back from the loop body after variables may be read in the loop. Also
         # consider all local variables as possibly read.
         elif isinstance(node, lal.BaseLoopStmt):
-            reads |= set(locvars.keys())
-            traverse_branch(node.f_stmts, {}, {}, reads, reads)
+            reads.update(locvars_mask)
+            traverse_branch(node.f_stmts, assigns.empty(), assigns.empty(),
+                            reads, reads)
             traverse(node.f_spec, assigns, reads)
             assigns.clear()
 
         # Reset assigns objects for exception handler, as control may come from
         # many sources, when exception is rethrown. Keep read variables.
         elif isinstance(node, lal.ExceptionHandler):
-            traverse_branch(node.f_stmts, {}, {}, reads, reads)
+            traverse_branch(node.f_stmts, assigns.empty(), assigns.empty(),
+                            reads, reads)
 
         # Control jumps after exit, goto or raise, hence do not consider any of
         # the assignments occurring in the code after these.
@@ -403,7 +410,7 @@ def explore(f, locvars, locsubprograms, subp):
                                lal.GotoStmt,
                                lal.RaiseStmt)):
             assigns.clear()
-            reads |= set(locvars.keys())
+            reads.update(locvars_mask)
             for sub in node:
                 traverse(sub, assigns, reads)
 
@@ -415,7 +422,7 @@ def explore(f, locvars, locsubprograms, subp):
                                lal.ExtendedReturnStmt)):
             assigns.clear()
             reads.clear()
-            reads |= params
+            reads.update(params_mask)
             for sub in node:
                 traverse(sub, assigns, reads)
 
@@ -453,7 +460,7 @@ def explore(f, locvars, locsubprograms, subp):
             if (callee is not None and
                     is_local_subprogram(callee, locsubprograms)):
                 assigns.clear()
-                reads |= set(locvars.keys())
+                reads.update(locvars_mask)
 
             for sub in reversed(node):
                 traverse(sub, assigns, reads)
@@ -467,46 +474,39 @@ def explore(f, locvars, locsubprograms, subp):
     # The initial set of reads is the set of subprogram parameters. This
     # includes the OUT and IN OUT parameters which can be read after the
     # subprogram returns.
-    reads = params.copy()
-    traverse_subp_body(subp, {}, reads)
-
-
-def do_file(f):
-    c = lal.AnalysisContext()
-    unit = c.get_from_file(f)
-    if unit.root is None:
-        print('Could not parse {}:'.format(f))
-        for diag in unit.diagnostics:
-            print('   {}'.format(diag))
-            return
-
-    for subp in unit.root.findall(lal.SubpBody):
-        # Collect local variables for which useless assignment will be
-        # detected.
-        locvars = {}
-        collect_local_vars(subp, locvars,
-                           no_renaming=True,
-                           no_unreferenced=True,
-                           no_warnings_off=True,
-                           no_address_taken=True,
-                           no_aliased=True)
-        # Filter out variables whose name indicates they are not used, or an
-        # indicator of success of a command with side-effect, which may not
-        # always be used.
-        for name in locvars.keys():
-            if is_ignored_name(name):
-                del locvars[name]
-        # Collect local subprograms which may update the value of local
-        # variables.
-        locsubprograms = set()
-        collect_local_subprograms(subp, locsubprograms)
-        # Main traversal function
-        explore(f, locvars, locsubprograms, subp)
+    reads = VarSet(index, params_mask)
+    traverse_subp_body(subp, PathFacts(index), reads)
+
+
+NODE_KINDS = (lal.SubpBody, )
+
+
+def check_node(subp, report):
+    # Collect local variables for which useless assignment will be
+    # detected.
+    locvars = {}
+    collect_local_vars(subp, locvars,
+                       no_renaming=True,
+                       no_unreferenced=True,
+                       no_warnings_off=True,
+                       no_address_taken=True,
+                       no_aliased=True)
+    # Filter out variables whose name indicates they are not used, or an
+    # indicator of success of a command with side-effect, which may not
+    # always be used.
+    for name in locvars.keys():
+        if is_ignored_name(name):
+            del locvars[name]
+    # Collect local subprograms which may update the value of local
+    # variables.
+    locsubprograms = set()
+    collect_local_subprograms(subp, locsubprograms)
+    # Main traversal function
+    explore(locvars, locsubprograms, subp, report)
 
 
 def main(args):
-    for f in args.files:
-        do_file(f)
+    checker_engine.run_checker(__name__, args)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,638 @@
+#! /usr/bin/env python
+
+"""
+This script runs several of the contrib checkers on the input Ada sources in a
+single pass: each file is parsed once and its tree is traversed once, each
+node being handed to the checkers that are interested in its kind.
+
+A checker is a module that defines:
+
+- NODE_KINDS, the tuple of node types it wants to visit;
+- check_node(node, report), called on each node of these types, which calls
+  report(line, column, message) for each issue found.
+
+It can also set WITH_TRIVIA to True if it needs comments in the token stream,
+and CHARSET to the charset it uses to decode source files when run standalone,
+which is also used here unless --charset is passed.
+Issues are reported grouped by checker, in the order of the --checkers list,
+and for each checker in the same order as when running this checker alone.
+
+Files can be distributed over several worker processes (see --jobs). Results
+are still output in the order of the input files, so that the output does not
+depend on the number of workers.
+
+Findings can be cached on disk (see --cache), so that files that did not
+change since the last run are not analyzed again. Cache entries are keyed by
+the checker version (the hash of its source, of this script's and of the other
+modules from this directory it uses, plus the version of Libadalang), the hash
+of the file content and the analysis options.
+"""
+
+from __future__ import (absolute_import, division, print_function)
+
+import argparse
+from collections import namedtuple
+import hashlib
+import importlib
+import json
+import multiprocessing
+import os
+import os.path
+import sys
+import tempfile
+import time
+import types
+
+import libadalang as lal
+
+CHECKERS = [
+    'check_bad_unequal',
+    'check_deref_null',
+    'check_same_logic',
+    'check_same_operands',
+    'check_same_test',
+    'check_same_then_else',
+    'check_subp_boxes',
+    'check_test_not_null',
+    'check_useless_assign',
+]
+"""
+Names of the modules for all the checkers that this engine can run.
+"""
+
+parser = argparse.ArgumentParser(description=__doc__)
+parser.add_argument('files', help='The files to analyze',
+                    type=str, nargs='+', metavar='F')
+parser.add_argument('--checkers', type=str, default=','.join(CHECKERS),
+                    help='Comma-separated list of checkers to run (default:'
+                         ' all of them)')
+parser.add_argument('--charset', type=str, default=None,
+                    help='Charset to use to decode source files')
+parser.add_argument('--jobs', '-j', type=int, default=1,
+                    help='Number of worker processes to use. 0 means one per'
+                         ' CPU.')
+parser.add_argument('--format', choices=('text', 'jsonl', 'sarif'),
+                    default='text',
+                    help='Output format: "file:line:column: message" lines,'
+                         ' one JSON object per file, or a SARIF log')
+parser.add_argument('--timings', action='store_true',
+                    help='In text format, print the time spent on each file'
+                         ' on the standard error stream. Timings are always'
+                         ' included in the other formats.')
+
+
+def add_cache_arguments(parser):
+    """
+    Add the command-line arguments controlling the findings cache to an
+    argument parser.
+    """
+    parser.add_argument('--cache', type=str, default=None, metavar='DIR',
+                        help='Directory where to cache findings, so that'
+                             ' unchanged files are not analyzed again')
+    parser.add_argument('--cache-stats', action='store_true',
+                        help='Print cache hit/miss statistics on the standard'
+                             ' error stream')
+
+
+add_cache_arguments(parser)
+
+
+Finding = namedtuple('Finding', 'checker line column message')
+"""
+Issue reported by a checker.
+"""
+
+FileResult = namedtuple('FileResult', 'file findings diagnostics time'
+                                       ' cache_hits cache_misses')
+"""
+Result of the analysis of one file: list of findings, list of diagnostics (as
+strings) if the file could not be parsed, time spent, in seconds, and number
+of checkers whose findings were found or not found in the cache.
+"""
+
+
+class Engine(object):
+    """
+    Run a set of checkers on files, sharing parsing and tree traversal.
+
+    Checkers that need trivia are run in a separate pass, with their own
+    analysis context, so that the token streams the other checkers work on are
+    not cluttered with comments. Likewise, checkers that decode source files
+    with different charsets are run in separate passes.
+    """
+
+    def __init__(self, checkers, charset=None, cache_dir=None,
+                 context_per_file=False):
+        """
+        :param list[module] checkers: Checker modules to run.
+        :param str|None charset: Charset to use to decode source files.
+        :param str|None cache_dir: If not None, directory for the findings
+            cache.
+        :param bool context_per_file: Whether to analyze each file in fresh
+            analysis contexts, so that units of previous files do not stay in
+            memory, as checkers used to do when run standalone.
+        """
+        self.checkers = checkers
+        self.context_per_file = context_per_file
+        charsets = {c: charset or getattr(c, 'CHARSET', None)
+                    for c in checkers}
+        self.cache = (FindingsCache(cache_dir, charsets)
+                      if cache_dir else None)
+
+        # Group checkers by pass, keeping the order of passes deterministic
+        passes = {}
+        for c in checkers:
+            key = (getattr(c, 'WITH_TRIVIA', False), charsets[c])
+            passes.setdefault(key, []).append(c)
+        self.passes = [
+            CheckerPass(passes[key], key[0], key[1]) for key in sorted(passes)
+        ]
+
+    def check_file(self, f):
+        """
+        Run all checkers on `f`.
+
+        :rtype: FileResult
+        """
+        start = time.time()
+
+        # Mapping from checkers to their findings
+        findings = {}
+
+        if self.cache:
+            with open(f, 'rb') as content:
+                content_hash = hashlib.sha1(content.read()).hexdigest()
+            for c in self.checkers:
+                cached = self.cache.get(c, content_hash)
+                if cached is not None:
+                    findings[c] = cached
+        cached_checkers = set(findings)
+
+        diagnostics = []
+        for p in self.passes:
+            to_run = [c for c in p.checkers if c not in findings]
+
+            # Do not even parse the file if all findings were cached
+            if not to_run:
+                continue
+
+            if self.context_per_file:
+                p.reset_context()
+            unit = p.context.get_from_file(f, with_trivia=p.with_trivia)
+            if unit.root is None:
+                diagnostics = [str(d) for d in unit.diagnostics]
+                break
+            for c in to_run:
+                findings[c] = []
+            p.run(unit, findings)
+
+        # Do not cache anything for files that cannot be parsed, so that
+        # diagnostics are reported on each run.
+        if self.cache and not diagnostics:
+            for c in self.checkers:
+                if c not in cached_checkers:
+                    self.cache.put(c, content_hash, findings[c])
+
+        return FileResult(
+            f, [finding for c in self.checkers
+                for finding in findings.get(c, [])],
+            diagnostics, time.time() - start,
+            len(cached_checkers),
+            len(self.checkers) - len(cached_checkers) if self.cache else 0
+        )
+
+    def run(self, files):
+        """
+        Run all checkers on the given files, yielding a FileResult for each
+        file, in order.
+        """
+        for f in files:
+            yield self.check_file(f)
+
+
+class CheckerPass(object):
+    """
+    Set of checkers that run during a single traversal of analysis units.
+    """
+
+    def __init__(self, checkers, with_trivia, charset):
+        self.checkers = checkers
+        self.with_trivia = with_trivia
+        self.charset = charset
+        self.context = lal.AnalysisContext(charset)
+        self.node_kinds = tuple(set(kind for c in checkers
+                                    for kind in c.NODE_KINDS))
+
+        # Cache for the checkers interested in each concrete node type
+        self.dispatch_table = {}
+
+    def reset_context(self):
+        """
+        Replace the analysis context of this pass with a fresh one.
+        """
+        self.context = lal.AnalysisContext(self.charset)
+
+    def checkers_for(self, node_type):
+        """
+        Return the list of checkers that want to visit nodes of the given
+        type.
+        """
+        try:
+            return self.dispatch_table[node_type]
+        except KeyError:
+            result = [c for c in self.checkers
+                      if issubclass(node_type, c.NODE_KINDS)]
+            self.dispatch_table[node_type] = result
+            return result
+
+    def run(self, unit, findings):
+        """
+        Traverse `unit` once, handing each node to the interested checkers.
+
+        :param dict[module, list[Finding]] findings: Lists to which the issues
+            of each checker are appended. Only the checkers in this mapping
+            are run.
+        """
+        def reporter(checker):
+            name = checker_name(checker)
+            checker_findings = findings[checker]
+
+            def report(line, column, message):
+                checker_findings.append(Finding(name, line, column, message))
+
+            return report
+
+        reports = {c: reporter(c) for c in self.checkers if c in findings}
+        for node in unit.root.findall(self.node_kinds):
+            for checker in self.checkers_for(type(node)):
+                report = reports.get(checker)
+                if report:
+                    checker.check_node(node, report)
+
+
+def checker_name(checker):
+    """
+    Return the name of a checker module, even when it is run as a script.
+
+    :rtype: str
+    """
+    if checker.__name__ == '__main__':
+        return os.path.splitext(os.path.basename(checker.__file__))[0]
+    return checker.__name__
+
+
+def source_hash(module):
+    """
+    Return the hash of the source file for `module`.
+
+    :rtype: str
+    """
+    path = module.__file__
+    if path.endswith(('.pyc', '.pyo')):
+        path = path[:-1]
+    with open(path, 'rb') as f:
+        return hashlib.sha1(f.read()).hexdigest()
+
+
+def project_modules(module):
+    """
+    Return the modules from the directory of this script that `module`
+    depends on, directly or not, including itself: the modules it imports and
+    the modules that define the functions and classes it imports.
+
+    :rtype: list[module]
+    """
+    def source_path(m):
+        path = getattr(m, '__file__', None)
+        if path is None:
+            return None
+        path = os.path.abspath(path)
+        if path.endswith(('.pyc', '.pyo')):
+            path = path[:-1]
+        return path
+
+    project_dir = os.path.dirname(source_path(sys.modules[__name__]))
+
+    # Mapping from source paths to modules. Modules are identified by their
+    # source, as scripts are also loaded as __main__.
+    result = {}
+    queue = [module]
+    while queue:
+        m = queue.pop()
+        path = source_path(m)
+        if (path is None or path in result
+                or os.path.dirname(path) != project_dir):
+            continue
+        result[path] = m
+        for value in vars(m).values():
+            if isinstance(value, types.ModuleType):
+                queue.append(value)
+            else:
+                module_name = getattr(value, '__module__', None)
+                if isinstance(module_name, str) and module_name in sys.modules:
+                    queue.append(sys.modules[module_name])
+    return [result[path] for path in sorted(result)]
+
+
+class FindingsCache(object):
+    """
+    On-disk cache for the findings of checkers on files.
+
+    Each entry is stored in its own file, named after its key, so that several
+    worker processes can use the same cache concurrently. Stale entries are
+    never removed: they are just not looked up anymore.
+    """
+
+    def __init__(self, directory, charsets):
+        """
+        :param str directory: Directory for cache entries.
+        :param dict[module, str|None] charsets: Charset used to decode source
+            files for each checker.
+        """
+        self.directory = directory
+        self.charsets = charsets
+        self.engine_version = '{}:{}:{}'.format(
+            source_hash(sys.modules[__name__]),
+            getattr(lal, 'version', None), getattr(lal, 'build_date', None)
+        )
+
+        # Mapping from checkers to their versions
+        self.versions = {}
+
+    def entry_path(self, checker, content_hash):
+        """
+        Return the path of the file for the entry corresponding to the
+        findings of `checker` on a file whose content has the given hash.
+        """
+        try:
+            version = self.versions[checker]
+        except KeyError:
+            version = self.versions[checker] = hashlib.sha1(
+                self.engine_version + ''.join(
+                    source_hash(m) for m in project_modules(checker)
+                )
+            ).hexdigest()
+
+        key = hashlib.sha1(json.dumps(
+            [checker_name(checker), version, content_hash,
+             [self.charsets[checker]]]
+        )).hexdigest()
+        return os.path.join(self.directory, key[:2], key[2:] + '.json')
+
+    def get(self, checker, content_hash):
+        """
+        Return the cached findings for `checker` on a file whose content has
+        the given hash, or None if there is no such entry.
+
+        :rtype: list[Finding]|None
+        """
+        try:
+            with open(self.entry_path(checker, content_hash)) as f:
+                entry = json.load(f)
+        except (IOError, ValueError):
+            return None
+        name = checker_name(checker)
+        return [Finding(name, line, column, message)
+                for line, column, message in entry]
+
+    def put(self, checker, content_hash, findings):
+        """
+        Store the findings of `checker` on a file whose content has the given
+        hash.
+        """
+        path = self.entry_path(checker, content_hash)
+        dirname = os.path.dirname(path)
+        if not os.path.isdir(dirname):
+            try:
+                os.makedirs(dirname)
+            except OSError:
+                # Another worker may have created it in the meantime
+                if not os.path.isdir(dirname):
+                    raise
+
+        # Write to a temporary file first, so that concurrent readers never
+        # see a partially written entry.
+        fd, tmp_path = tempfile.mkstemp(dir=dirname)
+        with os.fdopen(fd, 'w') as f:
+            json.dump([[fnd.line, fnd.column, fnd.message]
+                       for fnd in findings], f)
+        os.rename(tmp_path, path)
+
+
+class CacheStats(object):
+    """
+    Accumulate cache statistics over the results of a run.
+    """
+
+    def __init__(self, enabled):
+        """
+        :param bool enabled: Whether the run uses a cache. If not, nothing is
+            counted.
+        """
+        self.enabled = enabled
+        self.hits = 0
+        self.misses = 0
+        self.files = 0
+        self.skipped_files = 0
+
+    def count(self, results):
+        """
+        Yield the given results, accumulating statistics on the way.
+        """
+        for r in results:
+            if not self.enabled:
+                yield r
+                continue
+            self.hits += r.cache_hits
+            self.misses += r.cache_misses
+            self.files += 1
+            if r.cache_misses == 0 and not r.diagnostics:
+                self.skipped_files += 1
+            yield r
+
+    def report(self):
+        if not self.enabled:
+            print('Cache: disabled (see --cache)', file=sys.stderr)
+            return
+        total = self.hits + self.misses
+        print('Cache: {} hits, {} misses ({:.1f}% of checker runs skipped),'
+              ' {}/{} files not analyzed'.format(
+                  self.hits, self.misses,
+                  100.0 * self.hits / total if total else 0.0,
+                  self.skipped_files, self.files),
+              file=sys.stderr)
+
+
+# Engine for the current worker process, when running with several jobs
+worker_engine = None
+
+
+def init_worker(checker_names, charset, cache_dir):
+    global worker_engine
+    worker_engine = Engine(load_checkers(checker_names), charset, cache_dir)
+
+
+def check_file_in_worker(f):
+    return worker_engine.check_file(f)
+
+
+def run_parallel(checker_names, files, jobs, charset=None,
+                 cache_dir=None):
+    """
+    Run the given checkers on the given files, distributing files over `jobs`
+    worker processes, each with its own analysis contexts. Yield a FileResult
+    for each file, in order.
+
+    :param list[str] checker_names: Names of the checker modules to run.
+    :param list[str] files: Files to analyze.
+    :param int jobs: Number of worker processes. If 0, use one per CPU.
+    :param str|None charset: Charset to use to decode source files.
+    :param str|None cache_dir: If not None, directory for the findings cache.
+    """
+    pool = multiprocessing.Pool(jobs or None, init_worker,
+                                (checker_names, charset, cache_dir))
+    try:
+        # Files have very different sizes, so hand them out one at a time to
+        # keep all workers busy until the end.
+        for result in pool.imap(check_file_in_worker, files, chunksize=1):
+            yield result
+    finally:
+        pool.terminate()
+        pool.join()
+
+
+def print_text(results, timings=False):
+    """
+    Print results in the usual "file:line:column: message" format.
+    """
+    for r in results:
+        if r.diagnostics:
+            print('Could not parse {}:'.format(r.file))
+            for diag in r.diagnostics:
+                print('   {}'.format(diag))
+        for finding in r.findings:
+            print('{}:{}:{}: {}'.format(r.file, finding.line, finding.column,
+                                        finding.message))
+        if timings:
+            print('{}: {:.3f}s'.format(r.file, r.time), file=sys.stderr)
+
+
+def print_jsonl(results):
+    """
+    Print results as JSON Lines, one object per file.
+    """
+    for r in results:
+        print(json.dumps({
+            'file': r.file,
+            'time': r.time,
+            'diagnostics': r.diagnostics,
+            'findings': [f._asdict() for f in r.findings],
+        }, sort_keys=True))
+        sys.stdout.flush()
+
+
+def print_sarif(results, checker_names):
+    """
+    Print results as a SARIF 2.1.0 log. Per-file timings are stored in the
+    properties of the corresponding artifacts.
+    """
+    artifacts = []
+    sarif_results = []
+    notifications = []
+    for r in results:
+        location = {'uri': r.file}
+        artifacts.append({'location': location,
+                          'properties': {'time': r.time}})
+        for diag in r.diagnostics:
+            notifications.append({
+                'level': 'error',
+                'message': {'text': 'Could not parse {}: {}'.format(r.file,
+                                                                    diag)},
+            })
+        for f in r.findings:
+            sarif_results.append({
+                'ruleId': f.checker,
+                'level': 'warning',
+                'message': {'text': f.message},
+                'locations': [{'physicalLocation': {
+                    'artifactLocation': location,
+                    'region': {'startLine': f.line,
+                               'startColumn': f.column},
+                }}],
+            })
+
+    print(json.dumps({
+        'version': '2.1.0',
+        '$schema': 'https://json.schemastore.org/sarif-2.1.0.json',
+        'runs': [{
+            'tool': {'driver': {
+                'name': 'libadalang-contrib-checkers',
+                'rules': [{'id': name} for name in checker_names],
+            }},
+            'invocations': [{
+                'executionSuccessful': not notifications,
+                'toolExecutionNotifications': notifications,
+            }],
+            'artifacts': artifacts,
+            'results': sarif_results,
+        }],
+    }, indent=2, separators=(',', ': '), sort_keys=True))
+
+
+def run_checker(module_name, args):
+    """
+    Run a single checker. This is what checker scripts use when run
+    standalone.
+
+    :param str module_name: Name of the checker module, as in its __name__.
+    :param args: Command-line arguments, including the ones added by
+        add_cache_arguments.
+    """
+    engine = Engine([sys.modules[module_name]], cache_dir=args.cache,
+                    context_per_file=True)
+    stats = CacheStats(args.cache is not None)
+    print_text(stats.count(engine.run(args.files)))
+    if args.cache_stats:
+        stats.report()
+
+
+def load_checkers(names):
+    """
+    Import the checker modules with the given names.
+
+    :param list[str] names: Module names, with or without the "check_"
+        prefix.
+    :rtype: list[module]
+    """
+    return [importlib.import_module(
+        name if name.startswith('check_') else 'check_' + name
+    ) for name in names]
+
+
+def main(args):
+    checker_names = [checker_name(c) for c in load_checkers(
+        n.strip() for n in args.checkers.split(',') if n.strip()
+    )]
+
+    if args.jobs == 1:
+        results = Engine(load_checkers(checker_names), args.charset,
+                         args.cache).run(args.files)
+    else:
+        results = run_parallel(checker_names, args.files, args.jobs,
+                               args.charset, args.cache)
+    stats = CacheStats(args.cache is not None)
+    results = stats.count(results)
+
+    if args.format == 'jsonl':
+        print_jsonl(results)
+    elif args.format == 'sarif':
+        print_sarif(results, checker_names)
+    else:
+        print_text(results, args.timings)
+
+    if args.cache_stats:
+        stats.report()
+
+
+if __name__ == '__main__':
+    main(parser.parse_args())
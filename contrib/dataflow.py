@@ -0,0 +1,188 @@
+"""
+Helpers for the flow-sensitive contrib checkers (check_deref_null,
+check_test_not_null and check_useless_assign).
+
+These checkers traverse subprogram bodies following the structure of the
+control flow: at each branch, they analyze the branch with a copy of the facts
+known so far, and then merge the result back into the facts for the enclosing
+path. The sets of facts below make these copies and merges cheap: variables
+are numbered, sets of variables are stored as bitsets in integers, and the
+nodes attached to facts are kept in a table shared by all copies, where
+changes made while analyzing a branch are undone when the branch is closed.
+
+This module only provides the representation of facts: it builds no control
+flow graph and solves no equations. The checkers keep their structured
+traversals, which drop the facts established inside a branch when paths join
+and analyze loop bodies once, as their reports rely on this.
+"""
+
+from __future__ import (absolute_import, division, print_function)
+
+from bisect import bisect_left, insort
+
+
+class VarIndex(object):
+    """
+    Numbering of variables, or more generally of access paths, to be used as
+    bit positions in VarSet and PathFacts.
+    """
+
+    def __init__(self):
+        self.bits = {}
+
+        # Known names, in lexicographic order, so that the names that start
+        # with a given prefix can be found by a binary search.
+        self.sorted_names = []
+
+    def bit(self, name):
+        """
+        Return the bit for `name`, allocating one if needed.
+
+        :rtype: int
+        """
+        try:
+            return self.bits[name]
+        except KeyError:
+            result = self.bits[name] = 1 << len(self.bits)
+            insort(self.sorted_names, name)
+            return result
+
+    def mask(self, names):
+        """
+        Return the mask for all the given names.
+
+        :rtype: int
+        """
+        result = 0
+        for name in names:
+            result |= self.bit(name)
+        return result
+
+    def prefix_mask(self, prefix):
+        """
+        Return the mask for all the known names that start with `prefix`.
+
+        :rtype: int
+        """
+        names = self.sorted_names
+        result = 0
+        i = bisect_left(names, prefix)
+        while i < len(names) and names[i].startswith(prefix):
+            result |= self.bits[names[i]]
+            i += 1
+        return result
+
+
+class VarSet(object):
+    """
+    Set of variable names, stored as a bitset.
+    """
+
+    def __init__(self, index, bits=0):
+        """
+        :param VarIndex index: Numbering for variables.
+        :param int bits: Initial content of the set.
+        """
+        self.index = index
+        self.bits = bits
+
+    def __contains__(self, name):
+        return bool(self.bits & self.index.bits.get(name, 0))
+
+    def add(self, name):
+        self.bits |= self.index.bit(name)
+
+    def discard(self, name):
+        self.bits &= ~self.index.bits.get(name, 0)
+
+    def discard_prefixed(self, prefix):
+        """
+        Remove all the names that start with `prefix`.
+        """
+        if self.bits:
+            self.bits &= ~self.index.prefix_mask(prefix)
+
+    def update(self, other):
+        """
+        Add all the names in `other`, which can be a VarSet or a mask.
+        """
+        self.bits |= getattr(other, 'bits', other)
+
+    def intersection_update(self, other):
+        """
+        Remove all the names that are not in `other`.
+
+        :type other: VarSet
+        """
+        self.bits &= other.bits
+
+    def difference_update(self, other):
+        """
+        Remove all the names that are in `other`.
+
+        :type other: VarSet
+        """
+        self.bits &= ~other.bits
+
+    def clear(self):
+        self.bits = 0
+
+    def copy(self):
+        return VarSet(self.index, self.bits)
+
+    def empty(self):
+        """
+        Return an empty set using the same numbering for variables.
+        """
+        return VarSet(self.index)
+
+
+class PathFacts(VarSet):
+    """
+    Set of variables for which a fact holds on the current path, each being
+    associated to the node that established the fact (for instance the
+    dereference of a pointer).
+
+    Copies share the table of nodes. To get the same behavior as independent
+    dictionaries, a copy must be closed once the analysis of the branch it was
+    created for is done and before its parent is modified again: this undoes
+    all the changes made to the table since the copy was created.
+    """
+
+    def __init__(self, index, bits=0, nodes=None, trail=None):
+        self.index = index
+        self.bits = bits
+        self.nodes = {} if nodes is None else nodes
+
+        # Log of the previous values for the entries set in the table, used
+        # to undo changes.
+        self.trail = [] if trail is None else trail
+        self.mark = len(self.trail)
+
+    def add(self, name, node):
+        self.bits |= self.index.bit(name)
+        self.trail.append((name, self.nodes.get(name)))
+        self.nodes[name] = node
+
+    def node(self, name):
+        """
+        Return the node associated to `name`, which must be in the set.
+        """
+        return self.nodes[name]
+
+    def copy(self):
+        return PathFacts(self.index, self.bits, self.nodes, self.trail)
+
+    def empty(self):
+        return PathFacts(self.index, 0, self.nodes, self.trail)
+
+    def close(self):
+        """
+        Undo the changes to the table of nodes since this copy was created.
+        """
+        while len(self.trail) > self.mark:
+            name, node = self.trail.pop()
+            if node is None:
+                del self.nodes[name]
+            else:
+                self.nodes[name] = node
@@ -10,7 +10,9 @@ roughly one per logical line of code.
 
 from __future__ import (absolute_import, division, print_function)
 
+from array import array
 import argparse
+from bisect import bisect_left, bisect_right
 import datetime
 import os
 
@@ -31,9 +33,19 @@ import libadalang as lal
 # Also in 2009 a new algorithm was found to handle in linear time dynamic
 # suffix array (compute a suffix array after insertion/deletion of part of
 # the input).
+#
+# Sequences and suffix arrays are stored in arrays of machine integers rather
+# than in lists, to keep memory usage low on large inputs.
+
+def int_array(n):
+    """
+    Return an array of `n` zero integers.
+    """
+    return array('l', [0]) * n
+
 
 def radix_pass(a, b, r, n, k):
-    c = [0] * (k + 1)
+    c = int_array(k + 1)
     for i in range(n):
         c[r[a[i]]] += 1
     s = 0
@@ -47,20 +59,31 @@ def radix_pass(a, b, r, n, k):
 
 
 def suffix_array(s, k=256, n=None):
-    SA = []
+    """
+    Return the suffix array for `s`, an array of integers in [1, k]. Note
+    that `s` is padded with zeros in place.
+
+    :type s: array.array
+    :rtype: array.array
+    """
+    SA = array('l')
     if n is None:
         n = len(s)
-        s += [0, 0, 0]
+        s.extend((0, 0, 0))
 
-    n0 = (n + 2) / 3
-    n1 = (n + 1) / 3
-    n2 = n / 3
+    # The algorithm below assumes at least two suffixes
+    if n < 2:
+        return array('l', range(n))
+
+    n0 = (n + 2) // 3
+    n1 = (n + 1) // 3
+    n2 = n // 3
     n02 = n0 + n2
 
-    s12 = [0] * (n02 + 3)
-    SA12 = [0] * (n02 + 3)
-    s0 = [0] * n0
-    SA0 = [0] * n0
+    s12 = int_array(n02 + 3)
+    SA12 = int_array(n02 + 3)
+    s0 = int_array(n0)
+    SA0 = int_array(n0)
     j = 0
     for i in range(n + (n0 - n1)):
         if i % 3 != 0:
@@ -81,12 +104,14 @@ def suffix_array(s, k=256, n=None):
             c1 = s[SA12[i] + 1]
             c2 = s[SA12[i] + 2]
         if SA12[i] % 3 == 1:
-            s12[SA12[i] / 3] = name
+            s12[SA12[i] // 3] = name
         else:
-            s12[SA12[i] / 3 + n0] = name
+            s12[SA12[i] // 3 + n0] = name
 
     if name < n02:
         SA12 = suffix_array(s12, name, n02)
+        for i in range(n02):
+            s12[SA12[i]] = i + 1
     else:
         for i in range(n02):
             SA12[s12[i] - 1] = i
@@ -103,10 +128,10 @@ def suffix_array(s, k=256, n=None):
         i = SA12[t] * 3 + 1 \
             if SA12[t] < n0 else (SA12[t] - n0) * 3 + 2
         j = SA0[p]
-        if (SA12[t] < n0 and (s[i], s12[SA12[t] + n0]) <=
-                (s[j], s12[j / 3])) or \
-                (s[i], s[i + 1], s12[SA12[t] - n0 + 1]) <= \
-                (s[j], s[j + 1], s12[j / 3 + n0]):
+        if ((s[i], s12[SA12[t] + n0]) <= (s[j], s12[j // 3])
+                if SA12[t] < n0 else
+                (s[i], s[i + 1], s12[SA12[t] - n0 + 1]) <=
+                (s[j], s[j + 1], s12[j // 3 + n0])):
             SA.append(i)
             t += 1
             if t == n02:
@@ -128,6 +153,41 @@ def suffix_array(s, k=256, n=None):
     return SA
 
 
+def lcp_array(s, SA):
+    """
+    Return the LCP array for `s` and its suffix array `SA`: the I'th element
+    is the length of the longest common prefix of the suffixes SA[I] and
+    SA[I + 1] (the last element is 0).
+
+    This uses Kasai et al.'s algorithm, which runs in linear time: when going
+    from a suffix to the next one in the text, the length of the common prefix
+    with the following suffix in the suffix array decreases by at most one.
+
+    :type s: array.array
+    :type SA: array.array
+    :rtype: array.array
+    """
+    n = len(SA)
+    rank = int_array(n)
+    for i in range(n):
+        rank[SA[i]] = i
+
+    lcp = int_array(n)
+    h = 0
+    for i in range(n):
+        r = rank[i]
+        if r + 1 < n:
+            j = SA[r + 1]
+            while i + h < n and j + h < n and s[i + h] == s[j + h]:
+                h += 1
+            lcp[r] = h
+            if h > 0:
+                h -= 1
+        else:
+            h = 0
+    return lcp
+
+
 class Code(object):
     """
     Define a 'code' for a construct rooted at a given node, which consists in 3
@@ -296,6 +356,60 @@ class CodeChunk(object):
                 self.end >= cr.end)
 
 
+class CodeChunkPairs(object):
+    """
+    Set of pairs of duplicated code chunks between two given files, in which
+    only the widest pairs are kept: a pair is dropped when both its chunks are
+    included in the chunks of another pair.
+
+    Pairs are sorted by the first line of their first chunk, and the length of
+    the longest first chunk is kept, so that the pairs that may include or be
+    included in a new pair are found with binary searches instead of scanning
+    all the pairs.
+    """
+
+    def __init__(self):
+        self.begins = []
+        self.pairs = []
+        self.max_len = 0
+
+    def __iter__(self):
+        return iter(self.pairs)
+
+    def add(self, pair):
+        """Add a pair of chunks, unless it is included in another pair.
+
+        Remove the pairs that are included in the new pair.
+
+        :param pair: Pair of code chunks.
+        :type pair: (CodeChunk, CodeChunk)
+        """
+        first, second = pair
+
+        # Pairs including the new one have a first chunk starting before its
+        # own, but at most max_len lines before its end.
+        for i in range(bisect_left(self.begins, first.end - self.max_len),
+                       bisect_right(self.begins, first.begin)):
+            elt = self.pairs[i]
+            if elt[0].is_wider_than(first) and elt[1].is_wider_than(second):
+                return
+
+        # Pairs included in the new one have a first chunk starting within its
+        # own.
+        lo = bisect_left(self.begins, first.begin)
+        hi = bisect_right(self.begins, first.end)
+        kept = [elt for elt in self.pairs[lo:hi]
+                if not (first.is_wider_than(elt[0]) and
+                        second.is_wider_than(elt[1]))]
+        self.pairs[lo:hi] = kept
+        self.begins[lo:hi] = [elt[0].begin for elt in kept]
+
+        i = bisect_right(self.begins, first.begin)
+        self.begins.insert(i, first.begin)
+        self.pairs.insert(i, pair)
+        self.max_len = max(self.max_len, first.end - first.begin)
+
+
 def do_files(files, args):
     """
     Analyze a list of files. Issue messages on longer copy-pastes, either
@@ -333,12 +447,15 @@ def do_files(files, args):
     start_time = show_time(start_time,
                            'encode ast (code size: %s)' % len(codes))
 
-    ranked_code = [code.h for code in codes]
+    ranked_code = array('l', (code.h for code in codes))
     result = suffix_array(ranked_code, k=encoder.rank)
     start_time = show_time(start_time,
                            'compute suffix array (rank:%s)' % encoder.rank)
 
-    # Copy/Paste results arranged by paths
+    lcp = lcp_array(ranked_code, result)
+    start_time = show_time(start_time, 'compute LCP array')
+
+    # Copy/Paste results arranged by pairs of paths
     copy_pastes = {}
 
     # Keep track of some stats
@@ -350,30 +467,21 @@ def do_files(files, args):
         # Get the next two suffixes
         suffix = (result[index], result[index + 1])
 
+        # Size of the common prefix
+        prefix_length = lcp[index]
+
         # Discard if nothing in common
-        if ranked_code[suffix[0]] != ranked_code[suffix[1]]:
+        if prefix_length == 0:
             stats['no_prefix'] += 1
             continue
 
         # Check if a longuer prefix exist in the suffix array. Analyse
         # only the longuest prefixes.
         if suffix[0] > 0 and suffix[1] > 0 and \
-                codes[suffix[0] - 1].h == codes[suffix[1] - 1].h:
+                ranked_code[suffix[0] - 1] == ranked_code[suffix[1] - 1]:
             stats['skipped'] += 1
             continue
 
-        # Find the length of the common prefix between the two suffixes.
-        # The following code is a bit naive and can be removed in case the
-        # LCP table is computed at the same time as the suffix array.
-        # With skew algorithm this is possible (keeping the linear property).
-
-        # Size of the common prefix
-        prefix_length = 0
-
-        while ranked_code[suffix[0] + prefix_length] == \
-                ranked_code[suffix[1] + prefix_length]:
-            prefix_length += 1
-
         stats['prefix'] += 1
         # Two suffixes with similarities lasting more than min_size "items"
         if prefix_length + 1 >= args.min_size:
@@ -400,29 +508,12 @@ def do_files(files, args):
                     print('ingore %s vs %s' % (code[0], code[1]))
                     continue
 
-                if code[0].path not in copy_pastes:
-                    copy_pastes[code[0].path] = []
-
-                found = False
-                # This search is unoptimized but efficient as we usually
-                # deal with few elements per file (TODO: to be improved).
-                for index, elt in enumerate(copy_pastes[code[0].path]):
-                    if code[0].is_wider_than(elt[0]) and \
-                            code[1].is_wider_than(elt[1]):
-                        # Code duplication is a superset of a previous one, so
-                        # replace.
-                        copy_pastes[code[0].path][index] = code
-                        found = True
-                        break
-                    elif elt[0].is_wider_than(code[0]) and \
-                            elt[1].is_wider_than(code[1]):
-                        # Code duplication is a subset of a previous one, so
-                        # ignore.
-                        found = True
-                        break
-                if not found:
-                    # New code chunk
-                    copy_pastes[code[0].path].append(code)
+                # Code duplications that are supersets of previous ones
+                # replace them, and subsets of previous ones are ignored.
+                paths = (code[0].path, code[1].path)
+                if paths not in copy_pastes:
+                    copy_pastes[paths] = CodeChunkPairs()
+                copy_pastes[paths].add(code)
             else:
                 pass
                 # print 'discard %s' % code[0]
@@ -430,11 +521,14 @@ def do_files(files, args):
               'find copy/paste code (skipped: %(skipped)s, '
               'with prefix: %(prefix)s, with no prefix: %(no_prefix)s' % stats)
 
-    # Display the results
+    # Display the results, grouped by the path of the first chunk
+    chunks_by_path = {}
+    for (path, _), pairs in sorted(copy_pastes.items()):
+        chunks_by_path.setdefault(path, []).extend(pairs)
     if copy_pastes:
         print('%4s %4s: %s' % ('LINE', 'SIZE', 'CHUNKS'))
-    for chunks in copy_pastes.itervalues():
-        for chunk in sorted(chunks, key=lambda x: x[0].size):
+    for path in sorted(chunks_by_path):
+        for chunk in sorted(chunks_by_path[path], key=lambda x: x[0].size):
             print('%4d %4d: %-40s (%4d,%4d) ~= %-40s (%4d, %4d)' % (
                 len(chunk[0]),
                 chunk[0].size,
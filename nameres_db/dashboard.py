@@ -1,27 +1,180 @@
 from __future__ import absolute_import, division, print_function
 
-from flask import Flask
+from flask import Flask, Response, jsonify, request
 from flask_mako import MakoTemplates, render_template
-import funcy as F
+import functools
+import hashlib
 import pony.orm as P
 import schema as S
-import json
 
 app = Flask(__name__)
 app.config['MAKO_TRANSLATE_EXCEPTIONS'] = False
 mako = MakoTemplates(app)
 
+DIFF_LIMIT = 500
+"""
+Maximum number of rows to show for each category of the run diff page.
+"""
+
+PER_PAGE = 50
+"""
+Default number of items per page for JSON endpoints.
+"""
+
+MAX_PER_PAGE = 1000
+"""
+Maximum number of items per page that clients can request.
+"""
+
+RESPONSE_CACHE_SIZE = 1024
+"""
+Maximum number of JSON responses to keep in the response cache.
+"""
+
+response_cache = {}
+
+
+def page_args():
+    """
+    Return the (offset, limit) couple for the page requested by the "page"
+    (starting at 1) and "per_page" query arguments.
+    """
+    page = max(request.args.get('page', 1, type=int), 1)
+    per_page = min(max(request.args.get('per_page', PER_PAGE, type=int), 1),
+                   MAX_PER_PAGE)
+    return (page - 1) * per_page, per_page
+
+
+def cached_json(fn):
+    """
+    Decorator for JSON endpoints. Responses are identified by an ETag
+    computed from the request URL and the version of the data (see
+    ``schema.data_version``), so that:
+
+    * clients that already have the response get a 304 after a single cheap
+      query to get the data version;
+    * identical requests are served from an in-memory cache until data is
+      imported, in a new run or in an existing one.
+    """
+    @functools.wraps(fn)
+    @P.db_session
+    def wrapper(*args, **kwargs):
+        key = "{}:{}".format(S.data_version(), request.full_path)
+        etag = hashlib.sha1(key.encode('utf-8')).hexdigest()
+        if etag in request.if_none_match:
+            return Response(status=304, headers={'ETag': '"{}"'.format(etag)})
+
+        body = response_cache.get(etag)
+        if body is None:
+            body = jsonify(fn(*args, **kwargs)).get_data()
+            if len(response_cache) >= RESPONSE_CACHE_SIZE:
+                response_cache.clear()
+            response_cache[etag] = body
+
+        response = Response(body, mimetype='application/json')
+        response.set_etag(etag)
+        return response
+    return wrapper
+
 
 @app.route("/")
-@P.db_session
 def index():
-    projects = P.select(p for p in S.Project)
-    print(list(projects))
+    return render_template("index.mako")
+
+
+@app.route("/api/stats")
+@cached_json
+def api_stats():
+    return S.stats()
+
+
+@app.route("/api/projects")
+@cached_json
+def api_projects():
+    offset, limit = page_args()
+    return {
+        'total': S.count_projects(),
+        'items': [
+            {'id': id, 'name': name,
+             'nb_successes': nb_successes, 'nb_failures': nb_failures}
+            for id, name, nb_successes, nb_failures
+            in S.projects_stats(offset=offset, limit=limit)
+        ]
+    }
+
+
+@app.route("/api/files")
+@cached_json
+def api_files():
+    offset, limit = page_args()
+    project_id = request.args.get('project', type=int)
+    return {
+        'total': S.count_files(project_id),
+        'items': [
+            {'id': id, 'path': path,
+             'nb_successes': nb_successes, 'nb_failures': nb_failures}
+            for id, path, nb_successes, nb_failures
+            in S.files_stats(project_id=project_id,
+                             offset=offset, limit=limit)
+        ]
+    }
+
+
+@app.route("/api/failures")
+@cached_json
+def api_failures():
+    offset, limit = page_args()
+    project_id = request.args.get('project', type=int)
+    file_id = request.args.get('file', type=int)
+    return {
+        'total': S.count_failures(project_id=project_id, file_id=file_id),
+        'items': [
+            {'file': path, 'line': line, 'column': column,
+             'exception_message': exc, 'traceback_fingerprint': fingerprint}
+            for path, line, column, exc, fingerprint in S.failures(
+                project_id=project_id, file_id=file_id,
+                offset=offset, limit=limit
+            )
+        ]
+    }
+
+
+@app.route("/api/exceptions")
+@cached_json
+def api_exceptions():
+    offset, limit = page_args()
+    return {
+        'items': [
+            {'exception_message': exc, 'count': count}
+            for exc, count in S.failures_by_exception(offset=offset,
+                                                      limit=limit)
+        ]
+    }
+
+
+@app.route("/api/tracebacks")
+@cached_json
+def api_tracebacks():
+    offset, limit = page_args()
+    return {
+        'items': [
+            {'fingerprint': fingerprint, 'traceback': traceback,
+             'exception_message': exc, 'count': count}
+            for fingerprint, traceback, exc, count
+            in S.failures_by_traceback(offset=offset, limit=limit)
+        ]
+    }
+
+
+@app.route("/diff/<int:old_run_id>")
+@app.route("/diff/<int:old_run_id>/<int:new_run_id>")
+@P.db_session
+def diff(old_run_id, new_run_id=None):
+    new_run_id = new_run_id or S.last_run_id()
     return render_template(
-        "index.mako",
-        projects=list(P.select(p for p in S.Project)),
-        stats=S.stats(),
-        S=S, F=F, json=json
+        "diff.mako",
+        old_run_id=old_run_id, new_run_id=new_run_id,
+        diff=S.run_diff(old_run_id, new_run_id, limit=DIFF_LIMIT)
     )
 
 if __name__ == '__main__':
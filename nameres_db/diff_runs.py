@@ -0,0 +1,57 @@
+"""
+Print the differences in node resolutions between two runs.
+"""
+
+from __future__ import absolute_import, division, print_function
+
+import argparse as A
+from pony.orm import db_session
+import schema as S
+
+parser = A.ArgumentParser(description=__doc__)
+parser.add_argument('old_run_id', help='Id of the reference run', type=int)
+parser.add_argument(
+    'new_run_id',
+    help='Id of the run to compare. If not specified, use the last run',
+    type=int, nargs='?'
+)
+parser.add_argument(
+    '--project',
+    help='Only compare results for the project with the given name',
+    type=str
+)
+parser.add_argument(
+    '--limit',
+    help='Maximum number of lines to print for each category',
+    type=int
+)
+
+
+@db_session()
+def main():
+    args = parser.parse_args()
+    new_run_id = args.new_run_id or S.last_run_id()
+    project = None
+    if args.project:
+        project = S.Project.get(name=args.project)
+        if project is None:
+            parser.error('unknown project: {}'.format(args.project))
+
+    diff = S.run_diff(args.old_run_id, new_run_id, project, args.limit)
+
+    print("Newly failing nodes:")
+    for path, exc, count in diff['newly_failing']:
+        print("    {:>6} {}: {}".format(count, path, exc))
+
+    print("Newly passing nodes:")
+    for path, exc, count in diff['newly_passing']:
+        print("    {:>6} {} (was: {})".format(count, path, exc))
+
+    print("Nodes failing with a different exception:")
+    for path, old_exc, new_exc, count in diff['changed_exception']:
+        print("    {:>6} {}: {} -> {}".format(count, path, old_exc, new_exc))
+
+
+if __name__ == '__main__':
+    S.init_db()
+    main()
@@ -5,22 +5,22 @@ from __future__ import absolute_import, division, print_function
 
 import argparse as A
 from datetime import date
-from funcy import memoize
 import json
 from os import path as P
-from pony.orm import db_session
+from pony.orm import commit, db_session, flush
 import schema as S
+import time
 
 parser = A.ArgumentParser()
 parser.add_argument(
     'data_file',
     help='File containing the JSON data to populate the database',
-    type=str
+    type=str, nargs='?'
 )
 parser.add_argument(
     'project',
     help='Unique name of the project this data belongs to',
-    type=str
+    type=str, nargs='?'
 )
 parser.add_argument(
     '--run-id',
@@ -31,9 +31,38 @@ parser.add_argument(
 )
 
 
-class Obj(object):
-    def __init__(self, d):
-        self.__dict__ = d
+parser.add_argument(
+    '--batch-size',
+    help='Number of records to insert in the database at once',
+    type=int,
+    default=10000
+)
+
+parser.add_argument(
+    '--rebuild-stats',
+    help='Do not import anything, but recompute the summary tables used for'
+         ' stats for all runs and projects, for instance to fill them for'
+         ' runs imported before they existed',
+    action='store_true'
+)
+
+PRAGMAS = [
+    # Readers (the dashboard) are not blocked by the import, and the import
+    # does not have to write every page twice.
+    'pragma journal_mode = wal',
+    # An import can just be restarted if the machine crashes, so there is no
+    # need to sync at every write.
+    'pragma synchronous = off',
+    'pragma temp_store = memory',
+    'pragma cache_size = -262144',
+]
+
+
+@S.db.on_connect(provider='sqlite')
+def set_pragmas(db, connection):
+    cur = connection.cursor()
+    for pragma in PRAGMAS:
+        cur.execute(pragma)
 
 
 def parse_sloc(strn):
@@ -41,61 +70,167 @@ def parse_sloc(strn):
     return re.split(r"\-|:", strn)
 
 
-@memoize
-def create_or_get_file(db_project, path):
-    print("Processing file {}".format(path))
-    f, _ = S.File.get_or_create(full_path=P.abspath(path), project=db_project)
-    S.db.commit()
-    return f
+def batches(records, size):
+    """
+    Group the given iterable of records into lists of at most ``size``
+    records.
+    """
+    batch = []
+    for rec in records:
+        batch.append(rec)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def node_resolution_records(data_file):
+    """
+    Stream the node resolution records from the given JSON file, one record
+    per line.
+    """
+    with open(data_file) as f:
+        for line in f:
+            rec = json.loads(line)
+            if rec['kind'] == 'node_resolution':
+                yield rec
+
+
+class BulkImporter(object):
+    """
+    Import node resolutions in the database in batches: one set-based
+    statement per batch resolves all node ids and inserts all resolutions,
+    instead of several statements per record.
+
+    Statements go through the DB-API connection of the current db_session, in
+    the transaction Pony manages for it.
+    """
+
+    def __init__(self, project_id, run_id):
+        self.project_id = project_id
+        self.run_id = run_id
+        self.file_ids = {}
+        self.cur.execute("""
+            create temp table if not exists BatchResolution (
+                file integer, start_line integer, start_column integer,
+                end_line integer, end_column integer,
+                success boolean, exception_message text, traceback text,
+                traceback_fingerprint text
+            )
+        """)
+
+    @property
+    def cur(self):
+        return S.db.get_connection().cursor()
+
+    def file_ids_for(self, paths):
+        """
+        Create the File rows for the given paths that are not known yet, and
+        return a mapping from all paths to their File ids.
+        """
+        new_paths = [p for p in set(paths) if p not in self.file_ids]
+        if new_paths:
+            for p in new_paths:
+                print("Processing file {}".format(p))
+            self.cur.executemany(
+                "insert or ignore into File (full_path, project)"
+                " values (?, ?)",
+                [(P.abspath(p), self.project_id) for p in new_paths]
+            )
+            for p in new_paths:
+                self.file_ids[p] = self.cur.execute(
+                    "select id from File where full_path = ?", [P.abspath(p)]
+                ).fetchone()[0]
+        return self.file_ids
+
+    def add_batch(self, batch):
+        file_ids = self.file_ids_for(rec['file'] for rec in batch)
+        self.cur.executemany("""
+            insert into BatchResolution values (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """, [[file_ids[rec['file']]] + parse_sloc(rec['sloc'])
+              + [rec['success'],
+                 rec.get('exception_message', ''),
+                 rec.get('exception_traceback', ''),
+                 S.traceback_fingerprint(rec.get('exception_traceback'))]
+              for rec in batch])
+
+        self.cur.execute("""
+            insert or ignore
+            into Node (file, start_line, start_column, end_line, end_column)
+            select file, start_line, start_column, end_line, end_column
+            from BatchResolution
+        """)
+        self.cur.execute("""
+            insert or ignore into NodeResolution
+              (node, run_id, success, exception_message, traceback,
+               traceback_fingerprint)
+            select Node.id, ?, b.success, b.exception_message, b.traceback,
+                   b.traceback_fingerprint
+            from BatchResolution b
+            join Node on Node.file = b.file
+                     and Node.start_line = b.start_line
+                     and Node.start_column = b.start_column
+                     and Node.end_line = b.end_line
+                     and Node.end_column = b.end_column
+        """, [self.run_id])
+        self.cur.execute("delete from BatchResolution")
+
+
+def rebuild_stats():
+    with db_session(optimistic=False, immediate=True):
+        print("Rebuilt stats for {} runs/projects".format(
+            S.rebuild_summaries()
+        ))
+        S.record_update()
+        commit()
 
 
-@db_session()
 def main():
     args = parser.parse_args()
-    db_project, _ = S.Project.get_or_create(name=args.project)
-
-    print('Run id = ', args.run_id)
-    if args.run_id == -1:
-        run_id = S.RunId(date=date.today())
-    else:
-        run_id = S.RunId.get(id=args.run_id)
-    S.db.commit()
-    print(run_id, run_id.id)
-
-    with open(args.data_file) as f:
-        for line in f.readlines():
-            o = json.loads(line)
-            rec = Obj(o)
-            if rec.kind == 'node_resolution':
-                db_file = create_or_get_file(db_project, rec.file)
-                cur = S.db.get_connection().cursor()
-                bindings = [db_file.id] + parse_sloc(rec.sloc)
-                cur.execute("""
-                    insert or ignore
-                    into Node (file, start_line, start_column,
-                               end_line, end_column)
-                    values (?, ?, ?, ?, ?)
-                """, bindings)
-
-                node_id = cur.execute("""
-                    select id from Node
-                    where file=?
-                    and start_line=? and start_column=?
-                    and end_line=? and end_column=?
-                """, bindings).fetchone()[0]
-
-                cur.execute("""
-                insert or ignore into NodeResolution
-                  (node, run_id, success, exception_message, traceback)
-                values (?, ?, ?, ?, ?)
-                """, [node_id, run_id.id, rec.success,
-                      getattr(rec, 'exception_message', ''),
-                      getattr(rec, 'exception_traceback', '')])
-
-    print("Committing...")
-    S.db.commit()
-    if args.run_id == -1:
-        print("Run id={}".format(run_id.id))
+    if args.rebuild_stats:
+        rebuild_stats()
+        return
+    elif args.data_file is None or args.project is None:
+        parser.error('data_file and project are required')
+
+    # immediate=True makes Pony begin a transaction as soon as the connection
+    # is used, so that the statements of BulkImporter, which Pony does not
+    # see, run in it. The whole import is a single transaction: if it fails,
+    # neither the run nor its results and summaries are partially stored.
+    with db_session(optimistic=False, immediate=True):
+        db_project, _ = S.Project.get_or_create(name=args.project)
+
+        print('Run id = ', args.run_id)
+        if args.run_id == -1:
+            run_id = S.RunId(date=date.today())
+        else:
+            run_id = S.RunId.get(id=args.run_id)
+        flush()
+        print(run_id, run_id.id)
+
+        importer = BulkImporter(db_project.id, run_id.id)
+        nb_records = 0
+        start = time.time()
+        for batch in batches(node_resolution_records(args.data_file),
+                             args.batch_size):
+            importer.add_batch(batch)
+            nb_records += len(batch)
+            print("{} records ({:.0f} records/s)".format(
+                nb_records, nb_records / max(time.time() - start, 1e-6)
+            ))
+
+        print("Updating summaries...")
+        S.update_summaries(run_id.id, db_project.id)
+        S.record_update(run_id)
+        commit()
+
+        elapsed = time.time() - start
+        print("Imported {} records in {:.1f}s ({:.0f} records/s)".format(
+            nb_records, elapsed, nb_records / max(elapsed, 1e-6)
+        ))
+        if args.run_id == -1:
+            print("Run id={}".format(run_id.id))
 
 if __name__ == '__main__':
     S.init_db()
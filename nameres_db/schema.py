@@ -1,9 +1,10 @@
 from __future__ import absolute_import, division, print_function
 
-from datetime import date
-from funcy import memoize
+from datetime import date, datetime
+import hashlib
 import pony.orm as P
 import re
+import sqlite3
 
 db = P.Database()
 
@@ -33,14 +34,11 @@ def insert_or_ignore(entity, **args):
 class Project(db.Entity):
     name = P.Required(str, unique=True)
     files = P.Set('File')
+    run_stats = P.Set('RunStats')
+    exception_stats = P.Set('ExceptionStats')
 
-    @memoize
-    def stats(self):
-        print("In stats")
-        ret = stats(self)
-        print("LOL")
-        print("Ret = ", ret)
-        return ret
+    def stats(self, run_id=None):
+        return stats(self, run_id)
 
     @property
     def nb_failures(self):
@@ -53,13 +51,26 @@ class Project(db.Entity):
 
 class File(db.Entity):
     full_path = P.Required(str, unique=True)
-    project = P.Required(Project)
+    project = P.Required(Project, index=True)
     nodes = P.Set('Node')
 
 
 class RunId(db.Entity):
     date = P.Required(date)
     resolutions = P.Set('NodeResolution')
+    run_stats = P.Set('RunStats')
+    exception_stats = P.Set('ExceptionStats')
+    updates = P.Set('DataUpdate')
+
+
+class DataUpdate(db.Entity):
+    """
+    Log of the changes to the data: imports (including imports in an existing
+    run) and rebuilds of the summary tables. The last id identifies the
+    current state of the data, for caching purposes.
+    """
+    date = P.Required(datetime)
+    run_id = P.Optional(RunId)
 
 
 class Node(db.Entity):
@@ -85,62 +96,429 @@ class NodeResolution(db.Entity):
     success = P.Required(bool)
     exception_message = P.Optional(str)
     traceback = P.Optional(str)
+    traceback_fingerprint = P.Optional(str)
     P.composite_key(node, run_id)
+    P.composite_index(run_id, success)
+    P.composite_index(run_id, exception_message)
+    P.composite_index(run_id, traceback_fingerprint)
+
+
+class RunStats(db.Entity):
+    """
+    Number of successes and failures for a project in a run. Filled at import
+    time by ``update_summaries``, so that stats do not need to scan
+    NodeResolution.
+    """
+    run_id = P.Required(RunId)
+    project = P.Required(Project)
+    nb_successes = P.Required(int)
+    nb_failures = P.Required(int)
+    P.composite_key(run_id, project)
+
+
+class ExceptionStats(db.Entity):
+    """
+    Number of failures with a given exception message for a project in a run.
+    Filled at import time by ``update_summaries``.
+    """
+    run_id = P.Required(RunId)
+    project = P.Required(Project)
+    exception_message = P.Optional(str)
+    nb_failures = P.Required(int)
+    P.composite_key(run_id, project, exception_message)
+
+
+TRACEBACK_NOISE = [
+    # Load address of the executable, which changes from one run to another
+    (re.compile(r"^Load address:.*$", re.MULTILINE), ""),
+    # Code addresses
+    (re.compile(r"0x[0-9a-fA-F]+"), "0x?"),
+    # Line and column numbers
+    (re.compile(r":\d+(:\d+)?"), ":?"),
+    (re.compile(r"\s+"), " "),
+]
+
+
+def traceback_fingerprint(traceback):
+    """
+    Return a fingerprint for the given traceback, that does not depend on
+    code addresses and line numbers, so that the same failure gets the same
+    fingerprint across runs and builds. Return an empty string if there is no
+    traceback.
+    """
+    if not traceback:
+        return ""
+    for regexp, replacement in TRACEBACK_NOISE:
+        traceback = regexp.sub(replacement, traceback)
+    return hashlib.sha1(traceback.strip().encode('utf-8')).hexdigest()
+
+
+def migrate(filename):
+    """
+    Update a database created with a previous version of this schema, which
+    Pony would fail to map, as it does not add columns to existing tables:
+
+    * Add the traceback_fingerprint column of NodeResolution, and compute it
+      for the stored tracebacks.
+    """
+    conn = sqlite3.connect(filename)
+    try:
+        columns = [row[1] for row in
+                   conn.execute("pragma table_info(NodeResolution)")]
+        if columns and 'traceback_fingerprint' not in columns:
+            print("Computing traceback fingerprints...")
+            conn.execute("alter table NodeResolution add column"
+                         " traceback_fingerprint text not null default ''")
+            last_id = 0
+            while True:
+                rows = conn.execute("""
+                    select id, traceback from NodeResolution
+                    where id > ? and traceback != ''
+                    order by id limit 10000
+                """, [last_id]).fetchall()
+                if not rows:
+                    break
+                conn.executemany(
+                    "update NodeResolution set traceback_fingerprint = ?"
+                    " where id = ?",
+                    [(traceback_fingerprint(tb), id) for id, tb in rows]
+                )
+                last_id = rows[-1][0]
+            conn.execute("""
+                create index if not exists
+                idx_noderesolution__run_id_traceback_fingerprint
+                on NodeResolution (run_id, traceback_fingerprint)
+            """)
+            conn.commit()
+    finally:
+        conn.close()
 
 
 def init_db():
+    migrate('nameres.db')
     db.bind(provider='sqlite', filename='nameres.db', create_db=True)
     db.generate_mapping(create_tables=True)
 
 
-def stats(project=None, run_id=None):
-    if not run_id:
-        run_id = P.max(r.id for r in RunId)
+def last_run_id():
+    return P.max(r.id for r in RunId)
+
+
+def record_update(run_id=None):
+    """
+    Record that the data of the given run (or of all runs if None) changed.
+    """
+    DataUpdate(date=datetime.now(), run_id=run_id)
+
+
+def data_version():
+    """
+    Return a string that identifies the current state of the data: it changes
+    each time a run is created or data is imported or rebuilt.
+    """
+    return "{}:{}".format(*db.get_connection().cursor().execute(
+        "select (select max(id) from RunId), (select max(id) from DataUpdate)"
+    ).fetchone())
 
-    fail = P.select(n for n in NodeResolution
-                    if not n.success and n.run_id.id == run_id)
-    success = P.select(n for n in NodeResolution
-                       if n.success and n.run_id.id == run_id)
 
+def update_summaries(run_id, project_id):
+    """
+    Recompute the RunStats and ExceptionStats rows for the given run and
+    project from NodeResolution. This must be called each time resolutions
+    are added for this run and project.
+    """
+    cur = db.get_connection().cursor()
+    cur.execute("delete from RunStats where run_id = ? and project = ?",
+                [run_id, project_id])
+    cur.execute("""
+        insert into RunStats (run_id, project, nb_successes, nb_failures)
+        select ?, ?, coalesce(sum(nr.success), 0),
+               coalesce(sum(1 - nr.success), 0)
+        from NodeResolution nr
+        join Node n on n.id = nr.node
+        join File f on f.id = n.file
+        where nr.run_id = ? and f.project = ?
+    """, [run_id, project_id, run_id, project_id])
+
+    cur.execute("delete from ExceptionStats where run_id = ? and project = ?",
+                [run_id, project_id])
+    cur.execute("""
+        insert into ExceptionStats
+          (run_id, project, exception_message, nb_failures)
+        select ?, ?, nr.exception_message, count(*)
+        from NodeResolution nr
+        join Node n on n.id = nr.node
+        join File f on f.id = n.file
+        where nr.run_id = ? and f.project = ? and nr.success = 0
+        group by nr.exception_message
+    """, [run_id, project_id, run_id, project_id])
+
+
+def rebuild_summaries():
+    """
+    Recompute the RunStats and ExceptionStats rows of all runs and projects
+    from NodeResolution, for instance to fill them for runs imported before
+    these tables existed. Return the number of (run, project) couples.
+    """
+    cur = db.get_connection().cursor()
+    couples = cur.execute("""
+        select distinct nr.run_id, f.project
+        from NodeResolution nr
+        join Node n on n.id = nr.node
+        join File f on f.id = n.file
+    """).fetchall()
+    for run_id, project_id in couples:
+        update_summaries(run_id, project_id)
+    return len(couples)
+
+
+def stats(project=None, run_id=None):
+    if not run_id:
+        run_id = last_run_id()
+
+    query = """
+        select coalesce(sum(nb_failures), 0), coalesce(sum(nb_successes), 0)
+        from RunStats
+        where run_id = ?
+    """
+    bindings = [run_id]
     if project:
-        fail = fail.filter(lambda n: n.node.file.project == project)
-        success = success.filter(lambda n: n.node.file.project == project)
+        query += " and project = ?"
+        bindings.append(project.id)
 
-    nb_failures, nb_successes = P.count(fail), P.count(success),
+    cur = db.get_connection().cursor()
+    nb_failures, nb_successes = cur.execute(query, bindings).fetchone()
     nb_total = nb_failures + nb_successes
 
     return {
         'nb_failures': nb_failures,
         'nb_successes': nb_successes,
-        'failures_pct': nb_failures / float(nb_total) * 100,
-        'successes_pct': nb_successes / float(nb_total) * 100
+        'failures_pct': nb_failures / float(nb_total or 1) * 100,
+        'successes_pct': nb_successes / float(nb_total or 1) * 100
     }
 
 
-def failures_by_exception(run_id=None):
+def failures_by_exception(run_id=None, offset=0, limit=-1):
     if not run_id:
-        run_id = P.max(r.id for r in RunId)
+        run_id = last_run_id()
     cur = db.get_connection().cursor()
     return cur.execute("""
-        select exception_message, count(*)
-        from NodeResolution
-        where success = 0
-              and run_id = ?
-        group by exception_message order by count(*) desc
-    """, [run_id]).fetchall()
+        select exception_message, sum(nb_failures)
+        from ExceptionStats
+        where run_id = ?
+        group by exception_message order by sum(nb_failures) desc
+        limit ? offset ?
+    """, [run_id, limit, offset]).fetchall()
+
+
+RUN_DIFF_QUERIES = {
+    'newly_failing': """
+        select f.full_path, new.exception_message, count(*)
+        from NodeResolution new
+        join NodeResolution old on old.node = new.node and old.run_id = ?
+        join Node n on n.id = new.node
+        join File f on f.id = n.file
+        where new.run_id = ? and new.success = 0 and old.success = 1 {}
+        group by f.full_path, new.exception_message
+        order by count(*) desc
+    """,
+    'newly_passing': """
+        select f.full_path, old.exception_message, count(*)
+        from NodeResolution new
+        join NodeResolution old on old.node = new.node and old.run_id = ?
+        join Node n on n.id = new.node
+        join File f on f.id = n.file
+        where new.run_id = ? and new.success = 1 and old.success = 0 {}
+        group by f.full_path, old.exception_message
+        order by count(*) desc
+    """,
+    'changed_exception': """
+        select f.full_path, old.exception_message, new.exception_message,
+               count(*)
+        from NodeResolution new
+        join NodeResolution old on old.node = new.node and old.run_id = ?
+        join Node n on n.id = new.node
+        join File f on f.id = n.file
+        where new.run_id = ? and new.success = 0 and old.success = 0
+              and old.exception_message is not new.exception_message {}
+        group by f.full_path, old.exception_message, new.exception_message
+        order by count(*) desc
+    """,
+}
+
+
+def run_diff(old_run_id, new_run_id, project=None, limit=None):
+    """
+    Compare the node resolutions of two runs. Only nodes that were resolved
+    in both runs are considered.
+
+    Return a dict with three keys:
+
+    * 'newly_failing': list of (file, exception message, count) for nodes
+      that succeeded in the old run and fail in the new one.
+    * 'newly_passing': list of (file, old exception message, count) for nodes
+      that failed in the old run and succeed in the new one.
+    * 'changed_exception': list of (file, old exception message, new
+      exception message, count) for nodes that fail in both runs with
+      different exceptions.
+
+    Each list is sorted by decreasing count, and truncated to ``limit``
+    entries if it is not None.
+    """
+    filters, bindings = "", [old_run_id, new_run_id]
+    if project:
+        filters = "and f.project = ?"
+        bindings.append(project.id)
+    suffix = ""
+    if limit is not None:
+        suffix = " limit ?"
+        bindings.append(limit)
+
+    cur = db.get_connection().cursor()
+    return {
+        key: cur.execute(query.format(filters) + suffix, bindings).fetchall()
+        for key, query in RUN_DIFF_QUERIES.items()
+    }
 
 
-def failures_by_traceback(run_id=None):
+def failures_by_traceback(run_id=None, offset=0, limit=-1):
+    """
+    Return failures of the given run grouped by traceback fingerprint, sorted
+    by decreasing number of failures, as a list of (fingerprint, traceback,
+    exception message, count). The traceback and message are the ones of one
+    failure in the group.
+    """
     if not run_id:
-        run_id = P.max(r for r in RunId)
+        run_id = last_run_id()
     cur = db.get_connection().cursor()
-    return P.select(n for n in NodeResolution
-                    if not n.success
-                    and run_id == run_id)
     return cur.execute("""
-        select traceback, exception_message, count(*)
+        select traceback_fingerprint, min(traceback),
+               min(exception_message), count(*)
         from NodeResolution
-        where success = 0
-              and run_id = ?
-        group by traceback order by count(*) desc
-    """, [run_id]).fetchall()
+        where run_id = ? and traceback_fingerprint != ''
+        group by traceback_fingerprint order by count(*) desc
+        limit ? offset ?
+    """, [run_id, limit, offset]).fetchall()
+
+
+def count_projects():
+    return db.get_connection().cursor().execute(
+        "select count(*) from Project"
+    ).fetchone()[0]
+
+
+def projects_stats(run_id=None, offset=0, limit=-1):
+    """
+    Return a page of projects, sorted by name, as a list of (id, name,
+    number of successes, number of failures) for the given run.
+    """
+    if not run_id:
+        run_id = last_run_id()
+    cur = db.get_connection().cursor()
+    return cur.execute("""
+        select p.id, p.name, coalesce(s.nb_successes, 0),
+               coalesce(s.nb_failures, 0)
+        from Project p
+        left join RunStats s on s.project = p.id and s.run_id = ?
+        order by p.name
+        limit ? offset ?
+    """, [run_id, limit, offset]).fetchall()
+
+
+def count_files(project_id=None):
+    query, bindings = "select count(*) from File", []
+    if project_id:
+        query += " where project = ?"
+        bindings.append(project_id)
+    return db.get_connection().cursor().execute(
+        query, bindings
+    ).fetchone()[0]
+
+
+def files_stats(run_id=None, project_id=None, offset=0, limit=-1):
+    """
+    Return a page of files, sorted by path, as a list of (id, path, number of
+    successes, number of failures) for the given run. Only the files of the
+    page are aggregated.
+    """
+    if not run_id:
+        run_id = last_run_id()
+    where, bindings = "", []
+    if project_id:
+        where = "where project = ?"
+        bindings.append(project_id)
+    bindings += [limit, offset, run_id]
+    cur = db.get_connection().cursor()
+    return cur.execute("""
+        select f.id, f.full_path, coalesce(sum(nr.success), 0),
+               coalesce(sum(1 - nr.success), 0)
+        from (select id, full_path from File {}
+              order by full_path limit ? offset ?) f
+        left join Node n on n.file = f.id
+        left join NodeResolution nr on nr.node = n.id and nr.run_id = ?
+        group by f.id, f.full_path
+        order by f.full_path
+    """.format(where), bindings).fetchall()
+
+
+def count_failures(run_id=None, project_id=None, file_id=None):
+    """
+    Return the number of failed resolutions that ``failures`` pages through.
+    Unless restricted to a file, use the RunStats summaries.
+    """
+    if not run_id:
+        run_id = last_run_id()
+    cur = db.get_connection().cursor()
+    if file_id:
+        query = """
+            select count(*)
+            from NodeResolution nr
+            join Node n on n.id = nr.node
+            where nr.run_id = ? and nr.success = 0 and n.file = ?
+        """
+        bindings = [run_id, file_id]
+        if project_id:
+            query += """
+                and n.file in (select id from File where project = ?)
+            """
+            bindings.append(project_id)
+    else:
+        query = """
+            select coalesce(sum(nb_failures), 0) from RunStats
+            where run_id = ?
+        """
+        bindings = [run_id]
+        if project_id:
+            query += " and project = ?"
+            bindings.append(project_id)
+    return cur.execute(query, bindings).fetchone()[0]
+
+
+def failures(run_id=None, project_id=None, file_id=None, offset=0,
+             limit=-1):
+    """
+    Return a page of failed resolutions for the given run, optionally
+    restricted to a project or a file, as a list of (file path, start line,
+    start column, exception message, traceback fingerprint).
+    """
+    if not run_id:
+        run_id = last_run_id()
+    filters, bindings = "", [run_id]
+    if project_id:
+        filters += " and f.project = ?"
+        bindings.append(project_id)
+    if file_id:
+        filters += " and f.id = ?"
+        bindings.append(file_id)
+    bindings += [limit, offset]
+    cur = db.get_connection().cursor()
+    return cur.execute("""
+        select f.full_path, n.start_line, n.start_column,
+               nr.exception_message, nr.traceback_fingerprint
+        from NodeResolution nr
+        join Node n on n.id = nr.node
+        join File f on f.id = n.file
+        where nr.run_id = ? and nr.success = 0 {}
+        order by nr.id
+        limit ? offset ?
+    """.format(filters), bindings).fetchall()
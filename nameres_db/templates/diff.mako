@@ -0,0 +1,61 @@
+<%def name="diff_table(title, headers, rows)">
+<h4 class="mt-4">${ title } <span class="badge badge-secondary">${ sum(r[-1] for r in rows) }</span></h4>
+<table class="table table-sm table-striped">
+  <thead>
+    <tr>
+      % for header in headers:
+      <th>${ header }</th>
+      % endfor
+    </tr>
+  </thead>
+  <tbody>
+    % for row in rows:
+    <tr>
+      % for cell in row:
+      <td>${ cell }</td>
+      % endfor
+    </tr>
+    % endfor
+  </tbody>
+</table>
+</%def>
+
+<!doctype html>
+<html lang="en">
+  <head>
+    <meta charset="utf-8">
+    <meta name="viewport" content="width=device-width, initial-scale=1, shrink-to-fit=no">
+
+    <title>Run ${ old_run_id } vs run ${ new_run_id }</title>
+
+    <!-- Bootstrap core CSS -->
+  <link rel="stylesheet" href="https://stackpath.bootstrapcdn.com/bootstrap/4.1.3/css/bootstrap.min.css" integrity="sha384-MCw98/SFnGE8fJT3GXwEOngsV7Zt27NXFoaoApmYm81iuXoPkFOJwJ8ERdknLPMO" crossorigin="anonymous">
+
+    <!-- Custom styles for this template -->
+    <link href="${ url_for("static", filename="dashboard.css")}" rel="stylesheet">
+  </head>
+
+  <body>
+    <nav class="navbar navbar-dark fixed-top bg-dark flex-md-nowrap p-0 shadow">
+      <a class="navbar-brand col-sm-3 col-md-2 mr-0" href="${ url_for("index") }">Name resolution dashboard</a>
+    </nav>
+
+    <div class="container-fluid">
+      <main role="main" class="px-4">
+        <div class="d-flex justify-content-between flex-wrap flex-md-nowrap align-items-center pt-3 pb-2 mb-3 border-bottom">
+          <h1 class="h2">Run ${ old_run_id } vs run ${ new_run_id }</h1>
+        </div>
+
+        ${diff_table("Newly failing nodes",
+                     ["File", "Exception", "Nodes"],
+                     diff['newly_failing'])}
+        ${diff_table("Newly passing nodes",
+                     ["File", "Old exception", "Nodes"],
+                     diff['newly_passing'])}
+        ${diff_table("Nodes failing with a different exception",
+                     ["File", "Old exception", "New exception", "Nodes"],
+                     diff['changed_exception'])}
+      </main>
+    </div>
+  </body>
+</html>
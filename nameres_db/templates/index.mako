@@ -1,29 +1,3 @@
-<%def name="donut(title, id, data)">
-<canvas id="${ id }-donut"></canvas>
-<script>
-(function () {
-  var colors = ["rgb(255, 99, 132)","rgb(54, 162, 235)","rgb(255, 205, 86)"];
-  var data = {
-      labels: ${json.dumps(data[0])},
-      datasets: [
-        {
-          backgroundColor: colors,
-          data: ${json.dumps(data[1])}
-        }
-      ]
-  };
-  var donut = document.getElementById("${id}-donut");
-  if (donut) {
-    new Chart(donut, {
-        type: 'pie',
-        data: data,
-        options: { cutoutPercentage: 50 }
-    });
-  }
-})();
-</script>
-</%def>
-
 <!doctype html>
 <html lang="en">
   <head>
@@ -58,7 +32,7 @@
       <div class="row">
         <nav class="col-md-2 d-none d-md-block bg-light sidebar">
           <div class="sidebar-sticky">
-            <ul class="nav flex-column">
+            <ul class="nav flex-column" id="project-links">
               <li class="nav-item">
                 <a class="nav-link active" href="#">
                   <span data-feather="home"></span>
@@ -70,14 +44,6 @@
               <span>Projects</span>
             </h6>
 
-              % for project in projects:
-              <li class="nav-item">
-                <a class="nav-link" href="#">
-                  <span data-feather="file"></span>
-                  ${ project.name }
-                </a>
-              </li>
-              % endfor
             </ul>
 
           </div>
@@ -94,19 +60,10 @@
           </div>
 
           <div class="row">
-
               <div class="col">
                   <div class="card">
                       <div class="card-body">
                         <h5 class="card-title"> Node resolutions for all projects </h5>
-                        <% 
-                            fbt = S.failures_by_traceback()
-                            data = [
-                                [range(len(fbt))],
-                                []
-                            ]
-                        %>
-                        ${donut("Failures by traceback", "failures-bytb", data)}
                         <canvas id="all-projects-donut"></canvas>
                       </div>
                   </div>
@@ -115,38 +72,44 @@
               <div class="col">
                   <div class="card">
                       <div class="card-body">
-                        <h5 class="card-title"> Node resolutions for all projects </h5>
-                        <% data = [
-                            ['Successes', 'Failures'],
-                            [stats['nb_successes'], stats['nb_failures']]
-                        ] %>
-                        ${donut("Name resolution for all projects", "all-projects", data)}
-                        <canvas id="all-projects-donut"></canvas>
+                        <h5 class="card-title"> Failures by exception </h5>
+                        <table class="table table-sm">
+                          <tbody id="exceptions"></tbody>
+                        </table>
+                        <button id="more-exceptions" class="btn btn-sm btn-secondary">More</button>
+                      </div>
+                  </div>
+              </div>
+
+              <div class="col">
+                  <div class="card">
+                      <div class="card-body">
+                        <h5 class="card-title"> Failures by traceback </h5>
+                        <table class="table table-sm">
+                          <tbody id="tracebacks"></tbody>
+                        </table>
+                        <button id="more-tracebacks" class="btn btn-sm btn-secondary">More</button>
                       </div>
                   </div>
               </div>
           </div>
 
-          % for project_group in F.chunks(3, projects):
           <div class="row py-2">
-              % for project in project_group:
-              <div class="col-md-4 py-1">
+              <div class="col">
                   <div class="card">
                       <div class="card-body">
-                        <h5 class="card-title"> Node resolutions for ${ project.name } </h5>
-                        <% data = [
-                            ['Successes', 'Failures'],
-                            [project.nb_successes, project.nb_failures]
-                        ] %>
-                        ${donut("Name resolution for project " + project.name, project.name, data)}
-
-                        <a href="#" class="btn btn-primary">Project page</a>
+                        <h5 class="card-title"> Failures </h5>
+                        <table class="table table-sm">
+                          <tbody id="failures"></tbody>
+                        </table>
+                        <button id="more-failures" class="btn btn-sm btn-secondary">More</button>
                       </div>
                   </div>
               </div>
-              % endfor
           </div>
-          % endfor
+
+          <div class="row py-2" id="projects"></div>
+          <button id="more-projects" class="btn btn-secondary mb-4">More projects</button>
         </main>
       </div>
     </div>
@@ -165,5 +128,124 @@
     </script>
 
     <!-- Graphs -->
+    <script>
+      function donut(canvas, labels, data) {
+        new Chart(canvas, {
+            type: 'pie',
+            data: {
+              labels: labels,
+              datasets: [{
+                backgroundColor: ["rgb(54, 162, 235)", "rgb(255, 99, 132)"],
+                data: data
+              }]
+            },
+            options: { cutoutPercentage: 50 }
+        });
+      }
+
+      function text(tag, content) {
+        var elt = document.createElement(tag);
+        elt.textContent = content;
+        return elt;
+      }
+
+      // Fetch the next page of the given endpoint each time the button is
+      // clicked, and render its items with the given function. Unless lazy
+      // is true, fetch the first page right away.
+      function paginate(url, button, render, lazy) {
+        var page = 1, loaded = 0;
+        var sep = url.indexOf("?") < 0 ? "?" : "&";
+        function load() {
+          button.disabled = true;
+          fetch(url + sep + "page=" + page).then(function (response) {
+            return response.json();
+          }).then(function (data) {
+            data.items.forEach(render);
+            page += 1;
+            loaded += data.items.length;
+            button.disabled = false;
+            button.hidden = data.items.length === 0
+              || (data.total !== undefined && loaded >= data.total);
+          });
+        }
+        button.addEventListener("click", load);
+        if (!lazy) {
+          load();
+        }
+      }
+
+      fetch("/api/stats").then(function (response) {
+        return response.json();
+      }).then(function (stats) {
+        donut(document.getElementById("all-projects-donut"),
+              ["Successes", "Failures"],
+              [stats.nb_successes, stats.nb_failures]);
+      });
+
+      paginate("/api/exceptions", document.getElementById("more-exceptions"),
+        function (exc) {
+          var row = document.createElement("tr");
+          row.appendChild(text("td", exc.count));
+          row.appendChild(text("td", exc.exception_message));
+          document.getElementById("exceptions").appendChild(row);
+        });
+
+      paginate("/api/tracebacks", document.getElementById("more-tracebacks"),
+        function (tb) {
+          var row = document.createElement("tr");
+          row.appendChild(text("td", tb.count));
+          var cell = text("td", tb.exception_message);
+          cell.title = tb.traceback;
+          row.appendChild(cell);
+          document.getElementById("tracebacks").appendChild(row);
+        });
+
+      paginate("/api/failures", document.getElementById("more-failures"),
+        function (failure) {
+          var row = document.createElement("tr");
+          row.appendChild(text("td", failure.file + ":" + failure.line + ":"
+                                     + failure.column));
+          row.appendChild(text("td", failure.exception_message));
+          document.getElementById("failures").appendChild(row);
+        });
+
+      paginate("/api/projects", document.getElementById("more-projects"),
+        function (project) {
+          var item = document.createElement("li");
+          item.className = "nav-item";
+          var link = text("a", project.name);
+          link.className = "nav-link";
+          link.href = "#project-" + project.id;
+          item.appendChild(link);
+          document.getElementById("project-links").appendChild(item);
+
+          var col = document.createElement("div");
+          col.className = "col-md-4 py-1";
+          col.id = "project-" + project.id;
+          col.innerHTML =
+            '<div class="card"><div class="card-body">' +
+            '<h5 class="card-title"></h5><canvas></canvas>' +
+            '<table class="table table-sm"><tbody></tbody></table>' +
+            '<button class="btn btn-sm btn-secondary">Files</button>' +
+            '</div></div>';
+          col.querySelector("h5").textContent =
+            "Node resolutions for " + project.name;
+          document.getElementById("projects").appendChild(col);
+          donut(col.querySelector("canvas"), ["Successes", "Failures"],
+                [project.nb_successes, project.nb_failures]);
+
+          // Only load the files of a project when asked to
+          var files = col.querySelector("tbody");
+          paginate("/api/files?project=" + project.id,
+            col.querySelector("button"),
+            function (file) {
+              var row = document.createElement("tr");
+              row.appendChild(text("td", file.path));
+              row.appendChild(text("td", file.nb_successes));
+              row.appendChild(text("td", file.nb_failures));
+              files.appendChild(row);
+            }, true);
+        });
+    </script>
   </body>
 </html>
@@ -9,15 +9,18 @@ from __future__ import print_function, absolute_import, division
 
 import argparse
 from collections import defaultdict
-import cPickle
-from funcy import cat, chunks, memoize, partition_by, split_by
+from funcy import cat, memoize
 from glob import glob
+import hashlib
+import json
 import os
 import Queue
 import re
+import sqlite3
 import subprocess
-from threading import Event, Thread
+from threading import Event, Lock, Thread
 import time
+import traceback
 
 from langkit.utils import Colors, col
 
@@ -38,38 +41,54 @@ except ImportError:
         print("WARNING: calling embed but IPython is not present !")
 
 
-def load_or_create(file_name, constructor):
+DURATIONS_FILE = "durations_file"
+"""
+Name of the file in which the time it takes to analyze each file is saved, to
+schedule the longest files first in the next runs.
+"""
+
+
+def load_durations(file_name):
     if os.path.isfile(file_name):
         with open(file_name) as f:
-            return cPickle.load(f)
+            return json.load(f)
     else:
-        return constructor()
+        return {}
 
 
-def dump_to(obj, file_name):
+def dump_durations(durations, file_name):
     with open(file_name, "w") as f:
-        cPickle.dump(obj, f)
+        json.dump(durations, f, indent=2, sort_keys=True)
 
 
-def pmap(fn, collection, nb_threads=10):
+def pmap(fn, collection, nb_threads=10, on_interrupt=None):
     """
     Apply fn to each item in collection, returns a collection containing the
-    results. Uses threads to do the processing.
+    elements of the iterables it returns, as soon as they are produced. Uses
+    threads to do the processing.
 
     NOTES:
     - Since python uses a GIL, you won't get real parallelism except if your
       underlying function spawns processes (which is our case in the test
       driver).
+    - Items are handed out to threads in the order of the collection, one at
+      a time, as soon as a thread is free: put the longest items first to
+      avoid having idle threads at the end of the processing.
     - Order is not preserved by that algorithm, so it is not strictly a
       parallel map.
     - Items from collection are all consumed at once at the beginning to
       simplify the algorithm.
+    - On keyboard interrupt, or when the returned generator is closed before
+      all items are processed (for instance because the caller was
+      interrupted while handling a result), on_interrupt is called (if
+      provided) so that fn can be stopped, then threads are joined.
     """
 
     # Create an in queue and an out queue. The in queue will contain all the
     # data to be processed by the worker threads. The out queue will contain
-    # the results.
+    # the results, plus one DONE marker per thread.
     in_queue, out_queue = Queue.Queue(), Queue.Queue()
+    DONE = object()
 
     # Fill in the in queue with the items to process
     map(in_queue.put, collection)
@@ -80,64 +99,128 @@ def pmap(fn, collection, nb_threads=10):
     def consume():
         """
         Consumer function to be executed by all threads. Consume one item,
-        process it with fn, and put it in the out queue. Stop the thread when
-        the queue is empty.
+        process it with fn, and put the elements it yields in the out queue.
+        Stop the thread when the queue is empty.
         """
-        while e.is_set():
-            try:
-                out_queue.put(fn(in_queue.get_nowait()))
-            except Queue.Empty:
-                return
+        try:
+            while e.is_set():
+                try:
+                    item = in_queue.get_nowait()
+                except Queue.Empty:
+                    return
+                # Report exceptions instead of letting them kill the thread,
+                # which would silently drop the rest of the item.
+                try:
+                    for result in fn(item):
+                        out_queue.put(result)
+                except Exception as exc:
+                    print("Exception : {}".format(exc))
+                    print(traceback.format_exc())
+        finally:
+            out_queue.put(DONE)
 
     # Create the worker threads and start them
     threads = [Thread(target=consume) for _ in range(nb_threads)]
     map(Thread.start, threads)
+    nb_running = len(threads)
 
     try:
-        while True:
-            # If there is no item left in the in queue, wait for the threads to
-            # end and return the elements remaining in the out queue.
-            if in_queue.empty():
-                while any(t.is_alive() for t in threads):
-                    if not out_queue.empty():
-                        yield out_queue.get()
-                while not out_queue.empty():
-                    yield out_queue.get()
-                return
-            # If the in queue still contains elements, just return the results
-            # as they come.
+        while nb_running:
+            # Use a timeout so that keyboard interrupts are not delayed until
+            # the next result.
+            try:
+                result = out_queue.get(timeout=0.1)
+            except Queue.Empty:
+                continue
+            if result is DONE:
+                nb_running -= 1
             else:
-                yield out_queue.get()
+                yield result
     except KeyboardInterrupt:
         print("Terminating threads")
-        e.clear()
+    finally:
+        if nb_running:
+            e.clear()
+            if on_interrupt:
+                on_interrupt()
         map(Thread.join, threads)
 
 
+def schedule(files, durations, nb_jobs, chunk_size):
+    """
+    Split files into work units for pmap, ordered longest-first.
+
+    :param list[(str, str)] files: List of (directory, file name) couples.
+    :param dict[str, float] durations: Mapping from file paths to the time
+        it took to analyze them during previous runs. Files that are not in
+        this mapping are assumed to take as long as the slowest known file.
+    :param int nb_jobs: Number of jobs that will process work units.
+    :param int chunk_size: Maximum number of files per work unit.
+    :rtype: list[(str, list[str])]
+    """
+    default_duration = max(durations.values()) if durations else 1.0
+
+    def duration(dir, f):
+        return durations.get(os.path.join(dir, f), default_duration)
+
+    # Aim at many more units than jobs so that jobs that get slow units can
+    # let other jobs take care of the remaining ones.
+    total = sum(duration(dir, f) for dir, f in files)
+    target = total / (nb_jobs * 8)
+
+    by_dir = defaultdict(list)
+    for dir, f in files:
+        by_dir[dir].append(f)
+
+    units = []
+    for dir, dir_files in by_dir.items():
+        dir_files.sort(key=lambda f: duration(dir, f), reverse=True)
+        unit, unit_duration = [], 0.0
+        for f in dir_files:
+            unit.append(f)
+            unit_duration += duration(dir, f)
+            if unit_duration >= target or len(unit) >= chunk_size:
+                units.append((unit_duration, dir, unit))
+                unit, unit_duration = [], 0.0
+        if unit:
+            units.append((unit_duration, dir, unit))
+
+    units.sort(key=lambda u: u[0], reverse=True)
+    return [(dir, unit) for _, dir, unit in units]
+
+
 def memoized_property(f):
     return property(memoize(f))
 
 
+running_processes = set()
+running_processes_lock = Lock()
+
+
+def terminate_running_processes():
+    """
+    Kill all nameres processes that are currently running.
+    """
+    with running_processes_lock:
+        for p in running_processes:
+            p.terminate()
+
+
 class Result(object):
-    def __init__(self, lines, text):
-        import re
-        self.lines = lines
-        self.text = text
-        self.node = re.findall(
-            "for node (.*?)$", text, re.MULTILINE
-        )[0]
+    def __init__(self, record):
+        self.record = record
+        self.node = record['sloc']
 
     @memoized_property
     def lineno(self):
-        return self.node.split(" ")[-1].split(":")[0]
+        return self.node.split(":")[0]
 
     @staticmethod
-    def construct(file_result, lines):
-        text = "\n".join(lines)
-        if "Resolution failed" in text:
-            result = Failure(lines, text)
+    def construct(file_result, record):
+        if record['success']:
+            result = Success(record)
         else:
-            result = Success(lines, text)
+            result = Failure(record)
         result.file_result = file_result
         return result
 
@@ -154,16 +237,15 @@ class Success(Result):
 
 
 class Failure(Result):
-    def __init__(self, lines, text):
-        super(Failure, self).__init__(lines, text)
-        self.exception = None
-
-        if "exception" in self.text:
-            self.exception = [l for l in lines if l.startswith('>')][0]
-            self.traceback = split_by(lambda l: l != "Traceback:", lines)[1]
+    def __init__(self, record):
+        super(Failure, self).__init__(record)
+        self.exception = record.get('exception_message')
+        self.traceback = record.get('exception_traceback')
 
     def open_failure(self, editor=None):
-        print(self.text)
+        print(self.exception or "Resolution failed")
+        if self.traceback:
+            print(self.traceback)
         editor = editor or os.environ.get('EDITOR', 'vim')
         subprocess.check_call([
             editor, "+{}".format(self.lineno), self.file_result.file_path
@@ -180,6 +262,7 @@ class FileResult(object):
         self.successes = []
         self.failures = []
         self.has_crashed = False
+        self.duration = None
 
     def add(self, result):
         if isinstance(result, Success):
@@ -190,7 +273,7 @@ class FileResult(object):
 
     @memoized_property
     def is_success(self):
-        return len(self.failures) == 0
+        return len(self.failures) == 0 and not self.has_crashed
 
     @memoized_property
     def exceptions(self):
@@ -207,6 +290,14 @@ class FileResult(object):
 
     @staticmethod
     def nameres_files(dir, files, debug=False, project="", extra_args=[]):
+        """
+        Run nameres on the given files and yield a FileResult for each of
+        them, as soon as nameres is done with it.
+
+        nameres is run in JSON mode, and its output is consumed one record at
+        a time, so that memory usage does not depend on the size of the
+        output.
+        """
 
         if len(files) == 1:
             print("Analyzing file {}".format(files[0]))
@@ -215,51 +306,109 @@ class FileResult(object):
             "-P{}".format(project) if project else "--with-default-project"
         )
         extra_args = list(extra_args)
+        args = (
+            ["nameres", project_flag, '--all']
+            + (['--debug'] if debug else ['--json'])
+            + list(extra_args) + files
+        )
+
+        if debug:
+            try:
+                subprocess.check_call(args, cwd=dir)
+            finally:
+                print("Command line: {}".format(" ".join(args)))
+                print("Dir: {}".format(dir))
+            return
+
+        def create_file_result(file_name):
+            file_result = FileResult(file_name, dir)
+            file_result.extra_args = extra_args
+            file_result.project = project
+            return file_result
+
+        # FileResult instances for files being analyzed, i.e. for which we got
+        # node_resolution records but not the file_analysis one yet.
+        pending = {}
+        remaining_files = set(files)
+
+        p = subprocess.Popen(args, cwd=dir, stdout=subprocess.PIPE)
+        with running_processes_lock:
+            running_processes.add(p)
+
         try:
-            args = (
-                ["nameres", project_flag, '--all']
-                + (['--debug'] if debug else [])
-                + list(extra_args) + files
-            )
-            out = (subprocess.check_call
-                   if debug else subprocess.check_output)(args, cwd=dir)
-            if debug:
-                return
-            results = []
-            for res in out.split("Analyzing ")[1:]:
-                file_name, _, _, content = res.split("\n", 3)
-                content = content.strip()
-                file_result = FileResult(file_name, dir)
-                file_result.extra_args = extra_args
-                file_result.project = project
-                pb = iter(partition_by(lambda l: 'Resolving xrefs' in l,
-                                       content.splitlines()))
-                ct = list(zip(pb, pb))
-                for header, res_lines in ct:
-                    file_result.add(
-                        Result.construct(file_result, header + res_lines)
-                    )
-
-                results.append(file_result)
-            return results
-        except subprocess.CalledProcessError:
+            for file_result in FileResult.read_records(
+                iter(p.stdout.readline, ''), create_file_result, pending
+            ):
+                remaining_files.discard(file_result.file_name)
+                yield file_result
+        finally:
+            p.stdout.close()
+            returncode = p.wait()
+            with running_processes_lock:
+                running_processes.discard(p)
+
+        if returncode != 0:
             print("Resolution crashed.")
             print("Command line: {}".format(" ".join(args)))
-            return []
-        except Exception, e:
-            print("Exception : {}".format(e))
-            return []
-        finally:
-            if debug:
-                print("Command line: {}".format(" ".join(args)))
-                print("Dir: {}".format(dir))
+
+            # Report all files that were not completely analyzed as crashes
+            for file_name in sorted(remaining_files):
+                file_result = pending.get(file_name,
+                                          create_file_result(file_name))
+                file_result.has_crashed = True
+                yield file_result
+
+    @staticmethod
+    def read_records(lines, create_file_result, pending):
+        """
+        Read the JSON records that nameres outputs and yield a FileResult for
+        each file, as soon as its file_analysis record is read.
+
+        :param lines: Iterable for the lines of nameres's output. Lines that
+            are not JSON records are ignored.
+        :param create_file_result: Function that takes a file name and returns
+            a new FileResult for it.
+        :param dict[str, FileResult] pending: FileResult instances for files
+            being analyzed, i.e. for which node_resolution records were read
+            but not the file_analysis one yet. Updated as records are read.
+        """
+        for line in lines:
+            if not line.startswith('{'):
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError as e:
+                print("Invalid JSON record: {}".format(e))
+                continue
+
+            # Only per-file records are used here: other kinds of records
+            # (slowest_nodes for instance) are ignored.
+            kind = record.get('kind')
+            if kind not in ('node_resolution', 'file_analysis'):
+                continue
+
+            file_name = record['file']
+            if file_name not in pending:
+                pending[file_name] = create_file_result(file_name)
+            file_result = pending[file_name]
+
+            if kind == 'node_resolution':
+                file_result.add(Result.construct(file_result, record))
+            else:
+                file_result.has_crashed = 'exception_message' in record
+
+                # Use the time nameres measured for this file only, which
+                # excludes its startup and the other files it analyzes.
+                file_result.duration = record.get('time')
+                del pending[file_name]
+                yield file_result
 
     def rerun_nameres(self, debug=False, extra_args=[]):
         extra_args = list(extra_args)
-        res = self.nameres_files(self.dir, [self.file_name],
-                                 debug=debug,
-                                 extra_args=extra_args + self.extra_args,
-                                 project=self.project)
+        res = list(self.nameres_files(self.dir, [self.file_name],
+                                      debug=debug,
+                                      extra_args=extra_args + self.extra_args,
+                                      project=self.project))
         if res:
             return res[0]
 
@@ -274,14 +423,13 @@ class Results(object):
     def __len__(self):
         return len(self.successes) + len(self.failures)
 
-    def add(self, results):
-        for result in results:
-            if result.is_success:
-                self.successes.append(result)
-            elif result.has_crashed:
-                self.crashes.append(result)
-            else:
-                self.failures.append(result)
+    def add(self, result):
+        if result.is_success:
+            self.successes.append(result)
+        elif result.has_crashed:
+            self.crashes.append(result)
+        else:
+            self.failures.append(result)
 
     @memoized_property
     def individual_successes(self):
@@ -311,14 +459,250 @@ class Results(object):
         return [f for f in self.failures if f.file_name == filename][0]
 
 
+class ResultsStore(object):
+    """
+    SQLite database that keeps the results of all runs, indexed by run, file
+    and node sloc, so that runs can be compared without loading them in
+    memory.
+    """
+
+    SCHEMA = """
+        create table if not exists run (
+            id integer primary key autoincrement,
+            date text not null
+        );
+        create table if not exists file_result (
+            run_id integer not null references run(id),
+            path text not null,
+            deps_hash text not null,
+            status text not null,
+            primary key (run_id, path)
+        );
+        create table if not exists node_result (
+            run_id integer not null references run(id),
+            path text not null,
+            sloc text not null,
+            success integer not null,
+            exception_message text,
+            exception_traceback text
+        );
+        create index if not exists node_result_by_file
+            on node_result (run_id, path);
+    """
+
+    def __init__(self, file_name):
+        self.db = sqlite3.connect(file_name)
+        self.db.executescript(self.SCHEMA)
+
+    def last_run_id(self):
+        """
+        Return the id of the last completed run, or None if there is none.
+        """
+        return self.db.execute("select max(id) from run").fetchone()[0]
+
+    def new_run(self):
+        """
+        Create a new run and return its id. The run is recorded only when
+        ``commit`` is called.
+        """
+        return self.db.execute(
+            "insert into run (date) values (?)",
+            (time.strftime("%Y-%m-%d %H:%M:%S"), )
+        ).lastrowid
+
+    def commit(self):
+        self.db.commit()
+
+    def rollback(self):
+        self.db.rollback()
+
+    def add_file_result(self, run_id, file_result, deps_hash):
+        status = ('crash' if file_result.has_crashed else
+                  'success' if file_result.is_success else
+                  'failure')
+        self.db.execute(
+            "insert or replace into file_result values (?, ?, ?, ?)",
+            (run_id, file_result.file_path, deps_hash, status)
+        )
+        self.db.executemany(
+            "insert into node_result values (?, ?, ?, ?, ?, ?)",
+            [(run_id, file_result.file_path, r.node,
+              isinstance(r, Success),
+              r.record.get('exception_message'),
+              r.record.get('exception_traceback'))
+             for r in file_result.successes + file_result.failures]
+        )
+
+    def copy_file_results(self, from_run_id, to_run_id, paths):
+        """
+        Copy results for the given files from a run to another one.
+        """
+        for path in paths:
+            self.db.execute(
+                "insert or replace into file_result"
+                " select ?, path, deps_hash, status from file_result"
+                " where run_id = ? and path = ?",
+                (to_run_id, from_run_id, path)
+            )
+            self.db.execute(
+                "insert into node_result"
+                " select ?, path, sloc, success, exception_message,"
+                " exception_traceback from node_result"
+                " where run_id = ? and path = ?",
+                (to_run_id, from_run_id, path)
+            )
+
+    def deps_hashes(self, run_id):
+        """
+        Return a mapping from paths to dependency hashes for files that did
+        not crash in the given run.
+        """
+        return dict(self.db.execute(
+            "select path, deps_hash from file_result"
+            " where run_id = ? and status != 'crash'", (run_id, )
+        ))
+
+    def load_results(self, run_id, paths=None, project="", extra_args=[]):
+        """
+        Return FileResult instances for the given run. If paths is not None,
+        restrict them to the given file paths.
+
+        :rtype: list[FileResult]
+        """
+        file_results = {}
+        for path, status in self.db.execute(
+            "select path, status from file_result where run_id = ?",
+            (run_id, )
+        ):
+            if paths is not None and path not in paths:
+                continue
+            dir, file_name = os.path.split(path)
+            file_result = FileResult(file_name, dir)
+            file_result.has_crashed = status == 'crash'
+            file_result.project = project
+            file_result.extra_args = extra_args
+            file_results[path] = file_result
+
+        for path, sloc, success, exc_msg, exc_tb in self.db.execute(
+            "select path, sloc, success, exception_message,"
+            " exception_traceback from node_result where run_id = ?",
+            (run_id, )
+        ):
+            file_result = file_results.get(path)
+            if file_result is None:
+                continue
+            record = {'sloc': sloc, 'success': bool(success)}
+            if exc_msg is not None:
+                record['exception_message'] = exc_msg
+                record['exception_traceback'] = exc_tb
+            file_result.add(Result.construct(file_result, record))
+
+        return [file_results[p] for p in sorted(file_results)]
+
+    def newly_in_status(self, old_run_id, new_run_id, status):
+        """
+        Return the sorted list of paths for files that have the given status
+        in the new run, and had a different status (or were not analyzed) in
+        the old run.
+        """
+        return [row[0] for row in self.db.execute(
+            "select new.path from file_result new"
+            " left join file_result old"
+            " on old.path = new.path and old.run_id = ?"
+            " where new.run_id = ? and new.status = ?"
+            " and (old.status is null or old.status != new.status)"
+            " order by new.path",
+            (old_run_id, new_run_id, status)
+        )]
+
+
+WITH_CLAUSE_RE = re.compile(
+    r'^\s*(?:limited\s+)?(?:private\s+)?with\s+([\w\s.,]+);',
+    re.IGNORECASE | re.MULTILINE
+)
+
+
+def deps_hashes(files):
+    """
+    Compute a hash for each file that changes when the file or any of the
+    files it transitively depends on changes.
+
+    Dependencies are found syntactically (with clauses, spec of a body,
+    parent units) using GNAT's default naming scheme, and only among the
+    given files: changes in other units (the runtime for instance) are not
+    detected.
+
+    :param list[(str, str)] files: List of (directory, file name) couples.
+    :rtype: dict[str, str]
+    """
+    paths_by_basename = defaultdict(list)
+    for dir, f in files:
+        paths_by_basename[f.lower()].append(os.path.join(dir, f))
+
+    content_hashes = {}
+    direct_deps = {}
+
+    def unit_files(unit_name, ext):
+        return paths_by_basename.get(
+            '{}.{}'.format(unit_name.lower().replace('.', '-'), ext), []
+        )
+
+    for dir, f in files:
+        path = os.path.join(dir, f)
+        with open(path) as fp:
+            content = fp.read()
+        content_hashes[path] = hashlib.sha1(content).hexdigest()
+
+        unit_name, ext = os.path.splitext(f)
+        unit_name = unit_name.replace('-', '.')
+        deps = set()
+        for names in WITH_CLAUSE_RE.findall(content):
+            for name in names.split(','):
+                deps.update(unit_files(name.strip(), 'ads'))
+        if ext == '.adb':
+            deps.update(unit_files(unit_name, 'ads'))
+        if '.' in unit_name:
+            deps.update(unit_files(unit_name.rsplit('.', 1)[0], 'ads'))
+        deps.discard(path)
+        direct_deps[path] = deps
+
+    result = {}
+    for path in direct_deps:
+        closure, queue = set(), [path]
+        while queue:
+            p = queue.pop()
+            if p not in closure:
+                closure.add(p)
+                queue.extend(direct_deps[p])
+        result[path] = hashlib.sha1(''.join(
+            '{}:{}\n'.format(p, content_hashes[p]) for p in sorted(closure)
+        )).hexdigest()
+    return result
+
+
+RESULTS_FILE = "results.db"
+"""
+Name of the SQLite database in which results of all runs are stored.
+"""
+
+
 def main(dirs, pattern, j, chunk_size, automated,
-         no_resolution, project, extra_args):
+         no_resolution, project, extra_args, only_changed):
 
+    project = os.path.abspath(project)
+
+    store = prev_run_id = None
     if not automated:
-        print("Loading old results ..")
-        prev_results = load_or_create("results_file", lambda: None)
+        store = ResultsStore(RESULTS_FILE)
+        prev_run_id = store.last_run_id()
         if no_resolution:
-            results = prev_results
+            print("Loading old results ..")
+            results = Results()
+            if prev_run_id is not None:
+                for file_result in store.load_results(
+                    prev_run_id, project=project, extra_args=extra_args
+                ):
+                    results.add(file_result)
             embed()
             return
 
@@ -328,27 +712,55 @@ def main(dirs, pattern, j, chunk_size, automated,
         dir_files = sorted(glob('{}/*.ad?'.format(dir)))
         if pattern:
             dir_files = [f for f in dir_files if re.findall(pattern, f)]
-        dir_files = chunks(
-            chunk_size,
-            map(os.path.basename, dir_files)
-        )
-        files += [(dir, fs) for fs in dir_files]
-
-    project = os.path.abspath(project)
+        files += [(dir, os.path.basename(f)) for f in dir_files]
+
+    hashes = deps_hashes(files) if store else {}
+    run_id = store.new_run() if store else None
+
+    # In --only-changed mode, reuse the results of the previous run for all
+    # files whose dependency hash did not change.
+    if only_changed and prev_run_id is not None:
+        prev_hashes = store.deps_hashes(prev_run_id)
+        unchanged = set(path for path, h in hashes.items()
+                        if prev_hashes.get(path) == h)
+        files = [(dir, f) for dir, f in files
+                 if os.path.join(dir, f) not in unchanged]
+        print("Reusing results for {} unchanged files".format(len(unchanged)))
+        store.copy_file_results(prev_run_id, run_id, unchanged)
+        for file_result in store.load_results(
+            prev_run_id, unchanged, project=project, extra_args=extra_args
+        ):
+            results.add(file_result)
+
+    durations = load_durations(DURATIONS_FILE)
+    work_units = schedule(files, durations, j, chunk_size)
 
     raw_results = pmap(
         lambda (dir, f): FileResult.nameres_files(
             dir, f, project=project, extra_args=extra_args
         ),
-        files, nb_threads=j
+        work_units, nb_threads=j, on_interrupt=terminate_running_processes
     )
 
-    total_nb_files = sum(len(fs[1]) for fs in files)
+    total_nb_files = len(results) + len(results.crashes) + len(files)
 
+    # Make sure that worker threads and nameres processes are stopped if
+    # anything goes wrong while handling results, including interrupts.
     bar = ProgressBar(max_value=total_nb_files)
-    for subresults in raw_results:
-        results.add(subresults)
-        bar.update(len(results))
+    try:
+        for file_result in raw_results:
+            results.add(file_result)
+            bar.update(len(results) + len(results.crashes))
+            if file_result.duration is not None:
+                durations[file_result.file_path] = file_result.duration
+            if store:
+                store.add_file_result(run_id, file_result,
+                                      hashes[file_result.file_path])
+    finally:
+        raw_results.close()
+        terminate_running_processes()
+
+    dump_durations(durations, DURATIONS_FILE)
 
     if automated:
         print("ACATS Passing:")
@@ -402,25 +814,21 @@ def main(dirs, pattern, j, chunk_size, automated,
         for msg, files in results.exceptions_to_files:
             print("{}: {}".format(len(files), msg))
 
-    previously_passing = set()
-    previously_failing = set()
-    if prev_results is not None:
+    if prev_run_id is not None:
         print(col("Newly passing tests:", Colors.GREEN))
-        previously_passing = set(r.file_name for r in prev_results.successes)
-        now_passing = set(r.file_name for r in results.successes)
-        for f in (now_passing - previously_passing):
+        for f in store.newly_in_status(prev_run_id, run_id, 'success'):
             print("    {}".format(f))
 
         print(col("Newly failing tests:", Colors.RED))
-        previously_failing = set(r.file_name for r in prev_results.failures)
-        now_failing = set(r.file_name for r in results.failures)
-        for f in (now_failing - previously_failing):
+        for f in store.newly_in_status(prev_run_id, run_id, 'failure'):
             print("   {}".format(f))
 
     embed()
 
     if results.save:
-        dump_to(results, "results_file")
+        store.commit()
+    else:
+        store.rollback()
 
 
 if __name__ == '__main__':
@@ -430,11 +838,17 @@ if __name__ == '__main__':
     parser.add_argument('--pattern', '-p', type=str, default="",
                         help='Pattern to filter the files')
     parser.add_argument('--jobs', '-j', type=int, default=1)
-    parser.add_argument('--chunk-size', '-c', type=int, default=100)
+    parser.add_argument('--chunk-size', '-c', type=int, default=100,
+                        help='Maximum number of files to pass to each nameres'
+                             ' process')
     parser.add_argument('--project', '-P', type=str, default="")
     parser.add_argument('--no-resolution', '-N', action='store_true')
     parser.add_argument('--automated', '-A', action='store_true')
+    parser.add_argument('--only-changed', action='store_true',
+                        help='Only run name resolution on files that changed,'
+                             ' or whose dependencies changed, since the last'
+                             ' run, and reuse stored results for the others')
     args, extra_args = parser.parse_known_args()
     main(args.dirs, args.pattern, args.jobs, args.chunk_size,
          args.automated, args.no_resolution,
-         args.project, extra_args)
+         args.project, extra_args, args.only_changed)